@@ -1,26 +1,149 @@
 import requests
+import asyncio
 import json
 import time
 import re
 import os
-from typing import Dict, List, Tuple, Optional, Any
+import sys
+import ast
+import math
+import operator
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Optional, Any, Callable
 
-def llamar_ollama_api(prompt: str, modelo: str, temperatura: float = 0.7, timeout: int = 120) -> Tuple[str, Optional[str]]:
-    """Llama a la API REST de Ollama para generar una respuesta."""
+# El modelo debe detenerse antes de escribir la observación: la proporciona el entorno
+SECUENCIAS_PARADA_REACT = ["Observación:", "Observacion:"]
+
+# Respuestas HTTP con las que un servidor indica que no acepta el campo `tools`
+CODIGOS_SIN_HERRAMIENTAS = (404, 501)
+ERROR_SIN_HERRAMIENTAS = "El servidor no admite llamadas a herramientas"
+# Mensajes de error (HTTP 400) que indican que se rechazó el campo `tools`
+PATRON_SIN_HERRAMIENTAS = re.compile(r"(?:not|no|un)\s*support\w*.{0,40}tool|tool.{0,40}(?:not|no|un)\s*support", re.IGNORECASE | re.DOTALL)
+
+# Marcadores de sección de ReAct y la clave de `procesar_reacciones` que les corresponde
+MARCADORES_REACT = {"Pensamiento:": "pensamiento", "Acción:": "accion", "Observación:": "observacion"}
+_PATRON_MARCADORES = re.compile("|".join(map(re.escape, MARCADORES_REACT)))
+_PREFIJOS_MARCADORES = {marcador[:n] for marcador in MARCADORES_REACT for n in range(1, len(marcador))}
+_LARGO_PREFIJO = max(map(len, _PREFIJOS_MARCADORES))
+
+class AnalizadorReAct:
+    """Analizador de respuestas ReAct en una sola pasada, alimentado por fragmentos.
+    
+    Divide el texto en secciones en cada marcador `Pensamiento:`, `Acción:` u
+    `Observación:`; cada sección termina donde empieza el siguiente marcador.
+    Cada carácter se examina una vez: entre fragmentos solo se retiene la
+    cola que podría ser el principio de un marcador partido en dos, así que
+    analizar una respuesta en streaming cuesta lo mismo que analizarla
+    entera. `fin_primera_accion` indica dónde termina la primera línea
+    `Acción:` completa (salvo si es la respuesta final, que puede ocupar
+    varias líneas y termina con las secuencias de parada).
+    """
+    def __init__(self):
+        self.resultado: Dict[str, List[str]] = {"pensamiento": [], "accion": [], "observacion": []}
+        self.fin_primera_accion: Optional[int] = None
+        self._tipo: Optional[str] = None
+        self._partes: List[str] = []
+        self._pendiente = ""
+        self._consumidos = 0
+        self._vigilar_accion = True
+    
+    def alimentar(self, fragmento: str) -> None:
+        texto = self._pendiente + fragmento
+        inicio = 0
+        for marcador in _PATRON_MARCADORES.finditer(texto):
+            self._agregar(texto[inicio:marcador.start()], self._consumidos + inicio)
+            self._cerrar_seccion(self._consumidos + marcador.start())
+            self._tipo = MARCADORES_REACT[marcador.group()]
+            inicio = marcador.end()
+        corte = len(texto)
+        for largo in range(min(_LARGO_PREFIJO, len(texto) - inicio), 0, -1):
+            if texto[-largo:] in _PREFIJOS_MARCADORES:
+                corte = len(texto) - largo
+                break
+        self._agregar(texto[inicio:corte], self._consumidos + inicio)
+        self._consumidos += corte
+        self._pendiente = texto[corte:]
+    
+    def cerrar(self) -> Dict[str, List[str]]:
+        """Procesa lo que quede pendiente y devuelve las secciones encontradas."""
+        pendiente, self._pendiente = self._pendiente, ""
+        self._agregar(pendiente, self._consumidos)
+        self._consumidos += len(pendiente)
+        self._cerrar_seccion(self._consumidos)
+        self._tipo = None
+        return self.resultado
+    
+    def _agregar(self, texto: str, posicion: int) -> None:
+        if self._tipo is None or not texto:
+            return
+        if self._tipo == "accion" and self._vigilar_accion:
+            salto = texto.find("\n")
+            if salto != -1:
+                self._decidir_fin_accion("".join(self._partes) + texto[:salto], posicion + salto + 1)
+        self._partes.append(texto)
+    
+    def _cerrar_seccion(self, posicion: int) -> None:
+        if self._tipo == "accion" and self._vigilar_accion and self._partes:
+            # Otro marcador en la misma línea también cierra la acción
+            self._decidir_fin_accion("".join(self._partes), posicion)
+        if self._tipo is not None:
+            seccion = "".join(self._partes).strip()
+            if seccion:
+                self.resultado[self._tipo].append(seccion)
+        self._partes = []
+    
+    def _decidir_fin_accion(self, linea: str, posicion: int) -> None:
+        self._vigilar_accion = False
+        if linea.strip() and "respuesta final" not in linea.lower():
+            self.fin_primera_accion = posicion
+
+def llamar_ollama_api(prompt: str, modelo: str, temperatura: float = 0.7, timeout: int = 120,
+                      stop: Optional[List[str]] = None, cortar_tras_accion: bool = False) -> Tuple[str, Optional[str]]:
+    """Llama a la API REST de Ollama para generar una respuesta.
+    
+    `stop` son secuencias de parada. Con `cortar_tras_accion=True` la
+    respuesta se recibe en streaming y la conexión se cierra en cuanto llega
+    la primera línea `Acción:` completa, de modo que el servidor deja de
+    generar tokens que se descartarían.
+    """
     url = "http://localhost:11434/api/generate"
     
     payload = {
         "model": modelo,
         "prompt": prompt,
         "temperature": temperatura,
-        "stream": False
+        "stream": cortar_tras_accion
     }
+    if stop:
+        payload["options"] = {"stop": stop}
     
     try:
         print(f"Enviando solicitud a la API de Ollama (modelo: {modelo}, timeout: {timeout}s)...")
-        response = requests.post(url, json=payload, timeout=timeout)
+        response = requests.post(url, json=payload, timeout=timeout, stream=cortar_tras_accion)
         
-        if response.status_code == 200:
+        if response.status_code == 200 and cortar_tras_accion:
+            texto = ""
+            analizador = AnalizadorReAct()
+            with response:
+                # Una línea JSON por fragmento; la última lleva "done": true
+                for linea in response.iter_lines():
+                    if not linea:
+                        continue
+                    fragmento = json.loads(linea)
+                    trozo = fragmento.get("response", "")
+                    texto += trozo
+                    analizador.alimentar(trozo)
+                    fin = analizador.fin_primera_accion
+                    if fin is not None:
+                        print(f"✂️ Generación cortada tras la acción ({len(texto)} caracteres recibidos)")
+                        return texto[:fin], None
+                    if fragmento.get("done"):
+                        break
+            return texto, None
+        elif response.status_code == 200:
             result = response.json()
             return result.get("response", ""), None
         else:
@@ -35,6 +158,49 @@ def llamar_ollama_api(prompt: str, modelo: str, temperatura: float = 0.7, timeou
     except Exception as e:
         return "", f"Error inesperado: {str(e)}"
 
+def llamar_ollama_chat(mensajes: List[Dict[str, Any]], modelo: str, herramientas: List[Dict[str, Any]],
+                       temperatura: float = 0.7, timeout: int = 120,
+                       primera_llamada: bool = False) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Llama a la API de chat de Ollama ofreciendo herramientas (`tools`).
+    
+    Devuelve el mensaje del asistente, con `tool_calls` si el modelo decide
+    usar herramientas. Si el servidor o el modelo no admiten herramientas el
+    error es ERROR_SIN_HERRAMIENTAS, para que el llamador vuelva al modo de
+    texto. Un HTTP 400 solo se interpreta así en la `primera_llamada` o si su
+    mensaje lo dice; cualquier otro 400 (p. ej. contexto excedido) se
+    devuelve con su mensaje.
+    """
+    url = "http://localhost:11434/api/chat"
+    
+    payload = {
+        "model": modelo,
+        "messages": mensajes,
+        "tools": herramientas,
+        "stream": False,
+        "options": {"temperature": temperatura}
+    }
+    
+    try:
+        print(f"Enviando solicitud de chat con herramientas a Ollama (modelo: {modelo}, timeout: {timeout}s)...")
+        response = requests.post(url, json=payload, timeout=timeout)
+        
+        if response.status_code == 200:
+            return response.json().get("message", {}), None
+        elif response.status_code in CODIGOS_SIN_HERRAMIENTAS or (
+                response.status_code == 400 and (primera_llamada or PATRON_SIN_HERRAMIENTAS.search(response.text))):
+            return None, ERROR_SIN_HERRAMIENTAS
+        else:
+            error_msg = f"Error en la API: {response.status_code} - {response.text}"
+            print(error_msg)
+            return None, error_msg
+    
+    except requests.exceptions.Timeout:
+        return None, f"Timeout después de {timeout} segundos"
+    except requests.exceptions.ConnectionError:
+        return None, "Error de conexión. Verifica que Ollama esté en ejecución en localhost:11434"
+    except Exception as e:
+        return None, f"Error inesperado: {str(e)}"
+
 def verificar_modelos_disponibles() -> List[str]:
     """Verifica qué modelos están disponibles en Ollama."""
     try:
@@ -49,8 +215,14 @@ def verificar_modelos_disponibles() -> List[str]:
         print(f"Error al verificar modelos disponibles: {str(e)}")
         return []
 
-def procesar_reacciones(respuesta: str) -> Dict[str, str]:
+def procesar_reacciones(respuesta: str) -> Dict[str, List[str]]:
     """Extrae las secuencias de Pensamiento, Acción y Observación del texto de respuesta ReAct."""
+    analizador = AnalizadorReAct()
+    analizador.alimentar(respuesta)
+    return analizador.cerrar()
+
+def procesar_reacciones_regex(respuesta: str) -> Dict[str, List[str]]:
+    """Versión anterior de `procesar_reacciones` (tres expresiones regulares), para comparar."""
     resultado = {
         "pensamiento": [],
         "accion": [],
@@ -72,62 +244,758 @@ def procesar_reacciones(respuesta: str) -> Dict[str, str]:
     
     return resultado
 
-def simular_observacion(accion: str, problema: Dict[str, Any]) -> str:
-    """Simula observaciones basadas en acciones específicas para el problema."""
-    accion = accion.lower()
-    
-    # Simulación para problemas de búsqueda en Internet
-    if "buscar" in accion:
-        if "población" in accion and "parís" in accion:
-            return "Según datos recientes, la población de París es de aproximadamente 2.16 millones en la ciudad propiamente dicha, y más de 12 millones en el área metropolitana."
-        elif "capital" in accion and "francia" in accion:
-            return "La capital de Francia es París."
-        elif "monte" in accion and "everest" in accion:
-            return "El Monte Everest es la montaña más alta del mundo con una altura de 8,848.86 metros sobre el nivel del mar."
-        else:
-            return "La búsqueda no produjo resultados relevantes."
-    
-    # Simulación para problemas de cálculo
-    elif any(palabra in accion for palabra in ["calcular", "computar", "resolver"]):
-        if "área" in accion and "triángulo" in accion:
-            return "El área de un triángulo se calcula con la fórmula: A = (base × altura) ÷ 2"
-        elif "área" in accion and "círculo" in accion:
-            return "El área de un círculo se calcula con la fórmula: A = π × r²"
-        else:
-            return "No tengo información suficiente para realizar este cálculo específico."
-    
-    # Simulación para otras acciones específicas del problema
-    elif problema.get("tipo") == "planeacion_viaje":
-        if "vuelos" in accion or "avión" in accion:
-            return "Hay vuelos disponibles desde Madrid a París los lunes, miércoles y viernes, con precios desde 120€."
-        elif "tren" in accion:
-            return "El tren de alta velocidad conecta Madrid con París en 10 horas, con precios desde 180€."
-        elif "alojamiento" in accion or "hotel" in accion:
-            return "Hay varios hoteles disponibles en París, con precios entre 80€ y 300€ por noche dependiendo de la ubicación y categoría."
-        else:
-            return "No hay información específica disponible para esta consulta sobre el viaje."
+def comparar_analizadores(tamanos: Tuple[int, ...] = (4000, 16000, 32000), tam_fragmento: int = 64) -> None:
+    """Compara el analizador de una pasada con las expresiones regulares en entradas patológicas.
     
-    # Respuesta por defecto
-    else:
+    Para cada entrada se mide el análisis del texto completo y el análisis en
+    streaming: con expresiones regulares hay que volver a recorrer todo lo
+    recibido en cada fragmento, mientras que el analizador solo procesa el
+    fragmento nuevo.
+    """
+    entradas = {
+        "sin marcadores": "x" * 60 + "\n",
+        "pensamientos repetidos": "Pensamiento: sigo pensando ",
+        "casi marcadores": "Acción Pensamiento Observación Acci ",
+        "acciones seguidas": "Acción: Buscar algo\n",
+        "ciclos completos": "Pensamiento: reviso los datos.\nAcción: Calcular 2 + 2\nObservación: 4\n",
+    }
+    
+    def medir(funcion: Callable[[], Any], repeticiones: int = 3) -> float:
+        mejor = float("inf")
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            funcion()
+            mejor = min(mejor, time.perf_counter() - inicio)
+        return mejor * 1000
+    
+    def regex_en_streaming(texto: str) -> None:
+        for fin in range(tam_fragmento, len(texto) + tam_fragmento, tam_fragmento):
+            procesar_reacciones_regex(texto[:fin])
+    
+    def analizador_en_streaming(texto: str) -> None:
+        analizador = AnalizadorReAct()
+        for inicio in range(0, len(texto), tam_fragmento):
+            analizador.alimentar(texto[inicio:inicio + tam_fragmento])
+        analizador.cerrar()
+    
+    print(f"{'Entrada':<24}{'Tamaño':>8}{'Regex':>11}{'Una pasada':>12}{'Regex stream':>14}{'Stream':>10}  (ms, fragmentos de {tam_fragmento})")
+    for nombre, patron in entradas.items():
+        for tamano in tamanos:
+            texto = (patron * (tamano // len(patron) + 1))[:tamano]
+            print(f"{nombre:<24}{tamano:>8}"
+                  f"{medir(lambda: procesar_reacciones_regex(texto)):>11.2f}"
+                  f"{medir(lambda: procesar_reacciones(texto)):>12.2f}"
+                  f"{medir(lambda: regex_en_streaming(texto)):>14.2f}"
+                  f"{medir(lambda: analizador_en_streaming(texto)):>10.2f}")
+
+# Resultados simulados de la herramienta de búsqueda: (grupos de palabras clave, resultado).
+# Cada grupo es una tupla de alternativas y todos los grupos deben aparecer en la consulta.
+RESULTADOS_BUSQUEDA = [
+    ((("población",), ("parís",)),
+     "Según datos recientes, la población de París es de aproximadamente 2.16 millones en la ciudad propiamente dicha, y más de 12 millones en el área metropolitana."),
+    ((("capital",), ("francia",)),
+     "La capital de Francia es París."),
+    ((("monte",), ("everest",)),
+     "El Monte Everest es la montaña más alta del mundo con una altura de 8,848.86 metros sobre el nivel del mar."),
+]
+
+# Resultados simulados para el problema de planificación de viaje: (palabras clave alternativas, resultado)
+RESULTADOS_VIAJE = [
+    (("vuelos", "avión"), "Hay vuelos disponibles desde Madrid a París los lunes, miércoles y viernes, con precios desde 120€."),
+    (("tren",), "El tren de alta velocidad conecta Madrid con París en 10 horas, con precios desde 180€."),
+    (("alojamiento", "hotel"), "Hay varios hoteles disponibles en París, con precios entre 80€ y 300€ por noche dependiendo de la ubicación y categoría."),
+]
+
+# Calculadora: operadores, funciones y constantes permitidos al evaluar una expresión con `ast`
+_OPERADORES_CALCULO = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow,
+    ast.UAdd: operator.pos, ast.USub: operator.neg,
+}
+_FUNCIONES_CALCULO = {
+    "sqrt": math.sqrt, "raiz": math.sqrt, "sin": math.sin, "sen": math.sin, "cos": math.cos, "tan": math.tan,
+    "log": math.log10, "ln": math.log, "exp": math.exp, "abs": abs, "round": round, "redondear": round,
+}
+_CONSTANTES_CALCULO = {"pi": math.pi, "e": math.e}
+_PATRON_EXPRESION = re.compile(r"(?:\d+(?:\.\d+)?(?:e[-+]?\d+)?|\b(?:" + "|".join(list(_FUNCIONES_CALCULO) + list(_CONSTANTES_CALCULO))
+                               + r")\b|\*\*|[-+*/%(),]|[ \t])+")
+# Números con separadores (1.000, 8,848.86, 78,54) y, opcionalmente, exponente (6,022e23)
+_PATRON_NUMERO_SEPARADO = r"\d+(?:[.,]\d+)+(?:e[-+]?\d+)?"
+_UNIDADES_CALCULO = r"(?:cm|mm|km|m|kg|g|€|euros?|horas?|h|min|s)"
+# Dígitos máximos de cualquier operando o resultado (del orden del mayor float)
+_MAX_DIGITOS_CALCULO = 300
+
+def _digitos(valor: float) -> float:
+    """Número aproximado de dígitos enteros de un valor (log10 de su magnitud)."""
+    return math.log10(abs(valor)) if valor else 0.0
+
+def _comprobar_magnitud(digitos: float) -> None:
+    if digitos > _MAX_DIGITOS_CALCULO:
+        raise OverflowError(f"el resultado supera los {_MAX_DIGITOS_CALCULO} dígitos")
+
+def _evaluar_nodo_calculo(nodo: ast.AST) -> float:
+    if isinstance(nodo, ast.Expression):
+        return _evaluar_nodo_calculo(nodo.body)
+    if isinstance(nodo, ast.Constant) and isinstance(nodo.value, (int, float)) and not isinstance(nodo.value, bool):
+        _comprobar_magnitud(_digitos(nodo.value))
+        return nodo.value
+    if isinstance(nodo, ast.Name) and nodo.id in _CONSTANTES_CALCULO:
+        return _CONSTANTES_CALCULO[nodo.id]
+    if isinstance(nodo, ast.UnaryOp) and type(nodo.op) in _OPERADORES_CALCULO:
+        return _OPERADORES_CALCULO[type(nodo.op)](_evaluar_nodo_calculo(nodo.operand))
+    if isinstance(nodo, ast.BinOp) and type(nodo.op) in _OPERADORES_CALCULO:
+        izquierda, derecha = _evaluar_nodo_calculo(nodo.left), _evaluar_nodo_calculo(nodo.right)
+        # Se estima el tamaño antes de operar: las potencias anidadas crecen sin límite aunque cada exponente sea pequeño
+        if isinstance(nodo.op, ast.Pow) and abs(izquierda) > 1 and derecha > 0:
+            _comprobar_magnitud(derecha * _digitos(izquierda))
+        elif isinstance(nodo.op, ast.Mult):
+            _comprobar_magnitud(_digitos(izquierda) + _digitos(derecha))
+        resultado = _OPERADORES_CALCULO[type(nodo.op)](izquierda, derecha)
+        if isinstance(resultado, complex):
+            raise ValueError("el resultado no es un número real")
+        return resultado
+    if (isinstance(nodo, ast.Call) and isinstance(nodo.func, ast.Name) and nodo.func.id in _FUNCIONES_CALCULO
+            and not nodo.keywords):
+        argumentos = [_evaluar_nodo_calculo(argumento) for argumento in nodo.args]
+        if nodo.func.id in ("round", "redondear"):
+            argumentos = argumentos[:1] + [int(a) for a in argumentos[1:]]
+        return _FUNCIONES_CALCULO[nodo.func.id](*argumentos)
+    raise ValueError(f"elemento no permitido: {type(nodo).__name__}")
+
+def _separador_decimal(texto: str) -> Optional[str]:
+    """Separador decimal ("." o ",") que indican sin duda los números del texto, o None si no lo indican o se contradicen."""
+    decimales = set()
+    for numero in re.findall(_PATRON_NUMERO_SEPARADO, texto.lower()):
+        mantisa, exponente = re.fullmatch(r"([\d.,]+)(e[-+]?\d+)?", numero).groups()
+        separadores = re.findall(r"[.,]", mantisa)
+        grupos = re.split(r"[.,]", mantisa)
+        if len(set(separadores)) == 2:
+            decimales.add(separadores[-1])
+        elif len(separadores) > 1:
+            if all(len(grupo) == 3 for grupo in grupos[1:]):
+                decimales.add("," if separadores[0] == "." else ".")
+        elif exponente or grupos[0].startswith("0") or len(grupos[1]) != 3:
+            decimales.add(separadores[0])
+    return decimales.pop() if len(decimales) == 1 else None
+
+def _normalizar_numero(numero: str, decimal: Optional[str]) -> Optional[str]:
+    """Número con punto decimal y sin separadores de miles, o None si es ambiguo.
+    
+    `decimal` es el separador decimal que indican los demás números del texto.
+    Un único grupo de tres cifras (3.141, 2,500) puede ser de miles o de
+    decimales: sin esa pista solo se lee como miles si el grupo es 000 (1.000),
+    y en otro caso el número es ambiguo. Con un 0 delante (0.125) o con
+    exponente (6,022e23) el separador siempre es decimal.
+    """
+    mantisa, exponente = re.fullmatch(r"([\d.,]+)(e[-+]?\d+)?", numero).groups()
+    if exponente:
+        # 6,022e23 -> 6.022e23 (con exponente el separador es decimal)
+        return mantisa.replace(",", ".") + exponente if len(re.findall(r"[.,]", mantisa)) == 1 else None
+    # 8,848.86 y 8.848,86 -> 8848.86 (miles y decimales: el último separador es el decimal)
+    partes = re.fullmatch(r"(\d{1,3}(?:([.,])\d{3})+)([.,])(\d+)", mantisa)
+    if partes and partes.group(2) != partes.group(3):
+        return partes.group(1).replace(partes.group(2), "") + "." + partes.group(4)
+    # 1.234.567 y 1,234,567 -> 1234567 (varios grupos de miles)
+    if re.fullmatch(r"[1-9]\d{0,2}(?:\.\d{3}){2,}|[1-9]\d{0,2}(?:,\d{3}){2,}", mantisa):
+        return re.sub(r"[.,]", "", mantisa)
+    # 1.000, 2,500, 3.141: un solo grupo de tres cifras, según la convención del texto
+    if re.fullmatch(r"[1-9]\d{0,2}[.,]\d{3}", mantisa):
+        separador = mantisa[-4]
+        if decimal is None:
+            return mantisa.replace(separador, "") if mantisa.endswith("000") else None
+        return mantisa.replace(separador, "." if separador == decimal else "")
+    # 78,54, 0,125 y 3.14 -> decimales
+    return mantisa.replace(",", "") if "." in mantisa else mantisa.replace(",", ".")
+
+def numeros_ambiguos(texto: str) -> List[str]:
+    """Números del texto en los que no se puede saber si el separador es de miles o decimal."""
+    decimal = _separador_decimal(texto)
+    return [numero for numero in re.findall(_PATRON_NUMERO_SEPARADO, texto.lower())
+            if _normalizar_numero(numero, decimal) is None]
+
+def normalizar_expresion(texto: str) -> str:
+    """Pasa a sintaxis de Python la notación habitual (×, ÷, ^, ², π, separadores de miles, coma decimal, %) y quita las unidades."""
+    texto = texto.lower()
+    decimal = _separador_decimal(texto)
+    texto = re.sub(_PATRON_NUMERO_SEPARADO, lambda m: _normalizar_numero(m.group(0), decimal) or m.group(0), texto)
+    texto = re.sub(r"(\d)\s*" + _UNIDADES_CALCULO + r"(?:²|³|2|3)?(?![^\W\d_])", r"\1", texto)
+    for simbolo, reemplazo in (("×", "*"), ("·", "*"), ("÷", "/"), ("−", "-"), ("^", "**"), ("²", "**2"), ("³", "**3"),
+                               ("π", "pi"), ("√", "sqrt"), ("raíz", "raiz")):
+        texto = texto.replace(simbolo, reemplazo)
+    texto = re.sub(r"(\d)\s*x\s*(?=[\d(])", r"\1*", texto)
+    texto = re.sub(r"%\s*(?:de|del)\s+", "/100*", texto)
+    return re.sub(r"(\d)\s*%", r"(\1/100)", texto)
+
+def evaluar_expresiones(texto: str) -> List[Tuple[str, Optional[float], Optional[str]]]:
+    """Extrae y evalúa, en orden, todas las expresiones aritméticas del texto de una acción.
+    
+    Las expresiones se interpretan con `ast` y solo se admiten números, los
+    operadores aritméticos y las funciones y constantes de la calculadora, así
+    que no se ejecuta código arbitrario. Devuelve una tupla (expresion, valor,
+    error) por operación: con el valor si se pudo calcular o con el motivo si
+    es una división por cero o un resultado demasiado grande. Los fragmentos
+    que no son operaciones válidas se descartan. Si algún número es ambiguo
+    (3.141: ¿miles o decimales?) no se calcula nada y se devuelve ese número
+    con el motivo, en lugar de adivinar.
+    """
+    ambiguos = numeros_ambiguos(texto)
+    if ambiguos:
+        return [(numero, None, "número ambiguo: no se sabe si el separador es de miles o decimal, "
+                               "escríbelo sin separador de miles") for numero in ambiguos]
+    candidatas = [m.group(0).strip(" ,") for m in _PATRON_EXPRESION.finditer(normalizar_expresion(texto))]
+    candidatas = [c for c in candidatas if re.search(r"\d|\bpi\b", c) and re.search(r"[-+*/%]|\w\(", c)]
+    resultados = []
+    for expresion in candidatas:
+        try:
+            resultados.append((expresion, _evaluar_nodo_calculo(ast.parse(expresion, mode="eval")), None))
+        except ZeroDivisionError:
+            resultados.append((expresion, None, "división por cero"))
+        except OverflowError:
+            resultados.append((expresion, None, "el resultado es demasiado grande"))
+        except (SyntaxError, ValueError, TypeError):
+            continue
+    return resultados
+
+def formatear_numero(valor: float) -> Optional[str]:
+    """Texto del resultado, o None si no se puede representar."""
+    try:
+        if isinstance(valor, float) and valor.is_integer() and abs(valor) < 1e15:
+            return str(int(valor))
+        return str(round(valor, 6)) if isinstance(valor, float) else str(valor)
+    except (ValueError, OverflowError):
+        return None
+
+class Herramienta:
+    """Herramienta que el agente invoca con una acción del tipo `<verbo> <argumentos>`.
+    
+    `analizar` convierte el texto de la acción en los argumentos con nombre de
+    `funcion`, que devuelve la observación o None si la consulta no es de su
+    ámbito. Una herramienta sin `verbos` y con `tipos_problema` responde a
+    cualquier acción de esos problemas que ninguna otra haya resuelto.
+    `parametros` (nombre -> descripción) describe los argumentos para las
+    llamadas nativas de la API de chat. Se acumulan las llamadas y su latencia para las métricas (con un cerrojo,
+    porque las acciones de un mismo paso pueden ejecutarse en paralelo).
+    """
+    def __init__(self, nombre: str, descripcion: str, funcion: Callable[..., Optional[str]],
+                 verbos: Tuple[str, ...] = (), tipos_problema: Tuple[str, ...] = (),
+                 analizar: Optional[Callable[[str], Dict[str, Any]]] = None, sin_resultado: Optional[str] = None,
+                 parametros: Optional[Dict[str, str]] = None):
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self.funcion = funcion
+        self.verbos = verbos
+        self.tipos_problema = tipos_problema
+        self.analizar = analizar or (lambda texto: {"consulta": texto})
+        self.sin_resultado = sin_resultado
+        self.parametros = parametros or {"consulta": "Qué se quiere consultar"}
+        self.llamadas = 0
+        self.segundos = 0.0
+        self.segundos_max = 0.0
+        self._cerrojo = threading.Lock()
+    
+    def ejecutar(self, texto: str, problema: Dict[str, Any]) -> Optional[str]:
+        return self.invocar(self.analizar(texto), problema)
+    
+    def invocar(self, argumentos: Dict[str, Any], problema: Dict[str, Any]) -> Optional[str]:
+        inicio = time.perf_counter()
+        try:
+            return self.funcion(problema=problema, **argumentos)
+        finally:
+            duracion = time.perf_counter() - inicio
+            with self._cerrojo:
+                self.llamadas += 1
+                self.segundos += duracion
+                self.segundos_max = max(self.segundos_max, duracion)
+
+class RegistroHerramientas:
+    """Registro de herramientas indexado por el verbo de la acción.
+    
+    La herramienta se elige con una búsqueda en diccionario por la primera
+    palabra de la acción que sea un verbo registrado, así que el coste no
+    crece con el número de herramientas. Si ninguna la resuelve, se usa la
+    herramienta del tipo de problema (si la hay).
+    """
+    def __init__(self):
+        self.herramientas: Dict[str, Herramienta] = {}
+        self.por_verbo: Dict[str, Herramienta] = {}
+        self.por_tipo: Dict[str, Herramienta] = {}
+    
+    def registrar(self, herramienta: Herramienta) -> None:
+        self.herramientas[herramienta.nombre] = herramienta
+        for verbo in herramienta.verbos:
+            self.por_verbo[verbo] = herramienta
+        if not herramienta.verbos:
+            for tipo in herramienta.tipos_problema:
+                self.por_tipo[tipo] = herramienta
+    
+    def buscar(self, accion: str) -> Optional[Herramienta]:
+        """Devuelve la herramienta del primer verbo registrado que aparece en la acción."""
+        for palabra in re.findall(r"[^\W\d_]+", accion):
+            herramienta = self.por_verbo.get(palabra)
+            if herramienta is not None:
+                return herramienta
+        return None
+    
+    def ejecutar(self, accion: str, problema: Dict[str, Any]) -> str:
+        """Ejecuta la acción con la herramienta que le corresponde y devuelve la observación."""
+        accion = accion.lower()
+        herramienta = self.buscar(accion)
+        if herramienta is not None:
+            observacion = herramienta.ejecutar(accion, problema)
+            if observacion is not None:
+                return observacion
+        herramienta_tipo = self.por_tipo.get(problema.get("tipo"))
+        if herramienta_tipo is not None and herramienta_tipo is not herramienta:
+            observacion = herramienta_tipo.ejecutar(accion, problema)
+            if observacion is not None:
+                return observacion
+            if herramienta is None:
+                return herramienta_tipo.sin_resultado
+        if herramienta is not None:
+            return herramienta.sin_resultado
         return "No se pudo procesar la acción solicitada. Por favor, especifica mejor lo que quieres hacer."
+    
+    def disponibles(self, problema: Dict[str, Any]) -> List[Herramienta]:
+        """Herramientas aplicables al problema: las de verbo y las de su tipo de problema."""
+        return [h for h in self.herramientas.values() if h.verbos or problema.get("tipo") in h.tipos_problema]
+    
+    def esquemas(self, problema: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Describe las herramientas aplicables en el formato `tools` de la API de chat."""
+        return [{
+            "type": "function",
+            "function": {
+                "name": h.nombre,
+                "description": h.descripcion,
+                "parameters": {
+                    "type": "object",
+                    "properties": {p: {"type": "string", "description": d} for p, d in h.parametros.items()},
+                    "required": list(h.parametros)
+                }
+            }
+        } for h in self.disponibles(problema)]
+    
+    def ejecutar_llamada(self, nombre: str, argumentos: Dict[str, Any], problema: Dict[str, Any]) -> str:
+        """Ejecuta una llamada estructurada (nombre y argumentos) y devuelve la observación."""
+        herramienta = self.herramientas.get(nombre)
+        if herramienta is None:
+            return (f"La herramienta '{nombre}' no existe. Herramientas disponibles: "
+                    f"{', '.join(h.nombre for h in self.disponibles(problema))}.")
+        faltan = [p for p in herramienta.parametros if p not in argumentos]
+        if faltan:
+            return f"Faltan argumentos para '{nombre}': {', '.join(faltan)}."
+        observacion = herramienta.invocar({p: str(argumentos[p]).lower() for p in herramienta.parametros}, problema)
+        return observacion if observacion is not None else herramienta.sin_resultado
+    
+    def resumen_metricas(self) -> str:
+        """Llamadas y latencia media/máxima de cada herramienta usada."""
+        usadas = [h for h in self.herramientas.values() if h.llamadas]
+        if not usadas:
+            return "ninguna herramienta usada"
+        return "; ".join(f"{h.nombre}: {h.llamadas} llamada(s), media {h.segundos / h.llamadas * 1000:.2f} ms, "
+                         f"máx. {h.segundos_max * 1000:.2f} ms" for h in usadas)
 
-def ejecutar_react(prompt_base: str, problema: Dict[str, Any], modelo: str, max_iteraciones: int = 5) -> Tuple[str, List[Dict[str, Any]]]:
-    """Ejecuta el ciclo ReAct con interacciones simuladas."""
-    historial = []
-    prompt_completo = prompt_base + "\n\n" + problema["descripcion"] + "\n\nPensamiento:"
+def buscar_informacion(consulta: str, problema: Dict[str, Any]) -> Optional[str]:
+    """Herramienta de búsqueda (simulada con RESULTADOS_BUSQUEDA)."""
+    for grupos, resultado in RESULTADOS_BUSQUEDA:
+        if all(any(palabra in consulta for palabra in grupo) for grupo in grupos):
+            return resultado
+    return None
+
+def calcular(expresion: str, problema: Dict[str, Any]) -> Optional[str]:
+    """Herramienta de cálculo.
     
-    respuesta_final = ""
+    Si la acción contiene operaciones (p. ej. "Calcular (6 * 8) / 2") se
+    evalúan todas en el propio proceso con `evaluar_expresiones`; si solo la describe
+    con palabras se devuelven las fórmulas de las figuras de ejemplo.
+    """
+    resultados = evaluar_expresiones(expresion)
+    if resultados:
+        partes = []
+        for operacion, valor, error in resultados:
+            texto = formatear_numero(valor) if error is None else None
+            partes.append(f"{operacion} = {texto}" if texto is not None
+                          else f"{operacion}: error, {error or 'el resultado no se puede representar'}")
+        return "Resultado del cálculo: " + "; ".join(partes)
+    if "área" in expresion and "triángulo" in expresion:
+        return "El área de un triángulo se calcula con la fórmula: A = (base × altura) ÷ 2"
+    if "área" in expresion and "círculo" in expresion:
+        return "El área de un círculo se calcula con la fórmula: A = π × r²"
+    return None
+
+def consultar_viaje(consulta: str, problema: Dict[str, Any]) -> Optional[str]:
+    """Herramienta de transporte y alojamiento del problema de viaje (simulada con RESULTADOS_VIAJE)."""
+    for palabras, resultado in RESULTADOS_VIAJE:
+        if any(palabra in consulta for palabra in palabras):
+            return resultado
+    return None
+
+def crear_registro_herramientas() -> RegistroHerramientas:
+    """Crea el registro con las herramientas disponibles para los problemas de ejemplo."""
+    registro = RegistroHerramientas()
+    registro.registrar(Herramienta("buscar", "Busca información en Internet", buscar_informacion, verbos=("buscar",),
+                                   sin_resultado="La búsqueda no produjo resultados relevantes."))
+    registro.registrar(Herramienta("calcular", "Realiza un cálculo matemático", calcular,
+                                   verbos=("calcular", "computar", "resolver"),
+                                   analizar=lambda texto: {"expresion": texto},
+                                   parametros={"expresion": "Expresión matemática, por ejemplo (6 * 8) / 2 o pi * 5^2"},
+                                   sin_resultado="No tengo información suficiente para realizar este cálculo específico."))
+    registro.registrar(Herramienta("viaje", "Consulta transporte y alojamiento del viaje", consultar_viaje,
+                                   tipos_problema=("planeacion_viaje",),
+                                   sin_resultado="No hay información específica disponible para esta consulta sobre el viaje."))
+    return registro
+
+# Registro compartido por defecto
+HERRAMIENTAS = crear_registro_herramientas()
+
+# Aviso que acompaña a las observaciones servidas desde la caché
+AVISO_RESULTADO_CONOCIDO = "(Resultado ya conocido: esta consulta ya se había hecho antes; no hace falta repetirla.)"
+
+class CacheObservaciones:
+    """Caché de observaciones por acción normalizada, con caducidad y tamaño máximo.
     
-    for i in range(max_iteraciones):
-        print(f"\n--- Iteración {i+1}/{max_iteraciones} ---")
-        
-        # Obtener el siguiente pensamiento y acción del modelo
-        respuesta, error = llamar_ollama_api(prompt_completo, modelo, temperatura=0.7)
+    Acciones equivalentes ("Buscar la capital de Francia." y "buscar capital
+    de francia") comparten entrada. Las entradas caducan a los `ttl_segundos`
+    y, al superar `max_entradas`, se descarta la usada hace más tiempo (LRU).
+    Con `ruta` la caché se carga de un JSON y se reescribe de forma atómica
+    en cada entrada nueva. Es segura entre hilos, para las acciones en
+    paralelo.
+    """
+    ARTICULOS = {"el", "la", "los", "las", "un", "una", "unos", "unas"}
+    
+    def __init__(self, ttl_segundos: Optional[float] = 3600, max_entradas: int = 256, ruta: Optional[str] = None):
+        self.ttl_segundos = ttl_segundos
+        self.max_entradas = max_entradas
+        self.ruta = ruta
+        self.entradas: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+        self.caducadas = 0
+        self.descartadas = 0
+        self._lock = threading.Lock()
         
+        if ruta and os.path.exists(ruta):
+            try:
+                with open(ruta, "r", encoding="utf-8") as f:
+                    guardadas = json.load(f)
+                for clave, entrada in sorted(guardadas.items(), key=lambda item: item[1]["creado"]):
+                    if not self._caducada(entrada):
+                        self.entradas[clave] = entrada
+            except (json.JSONDecodeError, OSError, KeyError, TypeError, AttributeError) as e:
+                print(f"⚠️ No se pudo leer la caché de observaciones {ruta} ({e}); se empieza vacía")
+    
+    @classmethod
+    def clave(cls, accion: str, ambito: str = "") -> str:
+        """Acción sin diferencias de mayúsculas, espacios, signos finales, artículos ni forma Unicode."""
+        texto = unicodedata.normalize("NFC", accion).lower().replace("¿", "").replace("¡", "")
+        palabras = [palabra for palabra in texto.strip(" .,;:!?\"'").split() if palabra not in cls.ARTICULOS]
+        return f"{ambito}|{' '.join(palabras)}"
+    
+    def _caducada(self, entrada: Dict[str, Any]) -> bool:
+        return self.ttl_segundos is not None and time.time() - entrada["creado"] > self.ttl_segundos
+    
+    def obtener(self, accion: str, ambito: str = "") -> Optional[str]:
+        """Devuelve la observación guardada para la acción, o None si no la hay o ha caducado."""
+        clave = self.clave(accion, ambito)
+        with self._lock:
+            entrada = self.entradas.get(clave)
+            if entrada is not None and self._caducada(entrada):
+                del self.entradas[clave]
+                self.caducadas += 1
+                entrada = None
+            if entrada is None:
+                self.fallos += 1
+                return None
+            self.entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada["observacion"]
+    
+    def guardar(self, accion: str, observacion: str, ambito: str = "") -> None:
+        """Guarda la observación, descarta las entradas más antiguas si sobra alguna y persiste la caché."""
+        with self._lock:
+            clave = self.clave(accion, ambito)
+            self.entradas[clave] = {"accion": accion, "observacion": observacion, "creado": time.time()}
+            self.entradas.move_to_end(clave)
+            while len(self.entradas) > self.max_entradas:
+                self.entradas.popitem(last=False)
+                self.descartadas += 1
+            if self.ruta:
+                directorio = os.path.dirname(self.ruta)
+                if directorio:
+                    os.makedirs(directorio, exist_ok=True)
+                temporal = self.ruta + ".tmp"
+                with open(temporal, "w", encoding="utf-8") as f:
+                    json.dump(self.entradas, f, ensure_ascii=False, indent=2)
+                os.replace(temporal, self.ruta)
+    
+    def resumen(self) -> str:
+        consultas = self.aciertos + self.fallos
+        if not consultas:
+            return "sin consultas"
+        return (f"{self.aciertos}/{consultas} aciertos ({self.aciertos / consultas:.0%}), {len(self.entradas)} entradas, "
+                f"{self.caducadas} caducadas, {self.descartadas} descartadas")
+
+# Caché compartida por todas las ejecuciones de ReAct del proceso
+CACHE_OBSERVACIONES = CacheObservaciones()
+
+def observar_con_cache(cache: Optional[CacheObservaciones], accion: str, ambito: str, calcular: Callable[[], str]) -> str:
+    """Devuelve la observación de la caché (avisando de que ya era conocida) o la calcula y la guarda."""
+    if cache is None:
+        return calcular()
+    observacion = cache.obtener(accion, ambito)
+    if observacion is not None:
+        return f"{observacion} {AVISO_RESULTADO_CONOCIDO}"
+    observacion = calcular()
+    cache.guardar(accion, observacion, ambito)
+    return observacion
+
+def simular_observacion(accion: str, problema: Dict[str, Any], herramientas: Optional[RegistroHerramientas] = None,
+                        cache: Optional[CacheObservaciones] = None) -> str:
+    """Simula observaciones basadas en acciones específicas para el problema.
+    
+    Con `cache`, las acciones equivalentes ya ejecutadas se responden desde
+    la caché. La observación solo depende del tipo de problema si este
+    tiene una herramienta propia, así que solo entonces forma parte de la
+    clave.
+    """
+    herramientas = herramientas or HERRAMIENTAS
+    ambito = problema.get("tipo", "") if problema.get("tipo") in herramientas.por_tipo else ""
+    return observar_con_cache(cache, accion, ambito, lambda: herramientas.ejecutar(accion, problema))
+
+def extraer_acciones(respuesta: str) -> List[str]:
+    """Devuelve todas las acciones de la respuesta (una por cada `Acción:`), sin repetidas."""
+    return list(dict.fromkeys(procesar_reacciones(respuesta)["accion"]))
+
+def ejecutar_acciones(acciones: List[str], problema: Dict[str, Any], herramientas: Optional[RegistroHerramientas] = None,
+                      max_hilos: int = 4, cache: Optional[CacheObservaciones] = None) -> List[str]:
+    """Ejecuta a la vez acciones independientes y devuelve sus observaciones en el mismo orden."""
+    if len(acciones) <= 1:
+        return [simular_observacion(accion, problema, herramientas, cache) for accion in acciones]
+    with ThreadPoolExecutor(max_workers=min(max_hilos, len(acciones))) as ejecutor:
+        return list(ejecutor.map(lambda accion: simular_observacion(accion, problema, herramientas, cache), acciones))
+
+def combinar_observaciones(acciones: List[str], observaciones: List[str]) -> str:
+    """Une las observaciones de un lote numeradas en el orden de sus acciones."""
+    if len(observaciones) == 1:
+        return observaciones[0]
+    return "\n".join(f"[{n}] {accion}: {observacion}"
+                     for n, (accion, observacion) in enumerate(zip(acciones, observaciones), 1))
+
+def estimar_tokens(texto: str) -> int:
+    """Estimación aproximada del número de tokens de un texto (unos 4 caracteres por token)."""
+    return len(texto) // 4
+
+# Resúmenes ya generados, indexados por el texto resumido (LRU compartida por todo el proceso)
+_CACHE_RESUMENES: "OrderedDict[str, str]" = OrderedDict()
+_MAX_RESUMENES = 128
+_CERROJO_RESUMENES = threading.Lock()
+
+class HistorialReAct:
+    """Prompt de ReAct con compactación del historial según el tamaño del contexto.
+    
+    Los últimos `ciclos_literales` ciclos (respuesta del modelo y observación)
+    se mantienen tal cual. Cuando el prompt estimado supera `max_tokens`, los
+    ciclos anteriores se sustituyen por un resumen acumulado, que se genera
+    solo en ese momento con `generar` y se guarda en caché; así el prompt, y
+    con él la latencia de cada iteración, deja de crecer con la ejecución.
+    Para que el resumen siga siendo ocasional, los ciclos literales juntos
+    ocupan como mucho la mitad del presupuesto: las respuestas y observaciones
+    que no caben en su parte se recortan al añadirlas (de la respuesta se
+    conservan el principio del pensamiento y las acciones), en lugar de
+    resumir en cada paso.
+    Con `max_tokens=None` no se compacta nunca.
+    """
+    def __init__(self, cabecera: str, generar: Callable[[str], Tuple[str, Optional[str]]],
+                 max_tokens: Optional[int] = 3000, ciclos_literales: int = 3):
+        self.cabecera = cabecera
+        self.generar = generar
+        self.max_tokens = max_tokens
+        self.ciclos_literales = ciclos_literales
+        self.ciclos: List[Tuple[str, str]] = []
+        self.resumen = ""
+        self.ciclos_resumidos = 0
+        self.compactaciones = 0
+    
+    def agregar(self, respuesta: str, observacion: str) -> None:
+        if self.max_tokens is not None:
+            respuesta, observacion = self._recortar(respuesta, observacion)
+        self.ciclos.append((respuesta, observacion))
+        if (self.max_tokens is not None and len(self.ciclos) > self.ciclos_literales
+                and estimar_tokens(self.prompt()) > self.max_tokens):
+            self.compactar()
+    
+    def prompt(self) -> str:
+        partes = [self.cabecera]
+        if self.resumen:
+            partes.append(f"\n\nResumen de los pasos anteriores (1-{self.ciclos_resumidos}):\n{self.resumen}")
+        partes.append("\n\nPensamiento:")
+        partes.extend(f"\n{respuesta}\nObservación: {observacion}\n\nPensamiento:" for respuesta, observacion in self.ciclos)
+        return "".join(partes)
+    
+    def compactar(self) -> None:
+        """Resume todos los ciclos salvo los `ciclos_literales` más recientes."""
+        corte = len(self.ciclos) - self.ciclos_literales
+        antiguos, self.ciclos = self.ciclos[:corte], self.ciclos[corte:]
+        tokens_antes = estimar_tokens(self.prompt()) + sum(estimar_tokens(r + o) for r, o in antiguos)
+        self.resumen = self._resumir(antiguos)
+        self.ciclos_resumidos += len(antiguos)
+        self.compactaciones += 1
+        print(f"🗜️ Historial compactado: {len(antiguos)} ciclo(s) resumidos, "
+              f"prompt de ~{tokens_antes} a ~{estimar_tokens(self.prompt())} tokens")
+    
+    def _recortar(self, respuesta: str, observacion: str) -> Tuple[str, str]:
+        """Recorta respuesta y observación para que el ciclo no pase de su parte de la mitad del presupuesto."""
+        disponible = self.max_tokens - estimar_tokens(self.cabecera) - estimar_tokens(self.resumen)
+        maximo = max(disponible // (2 * max(self.ciclos_literales, 1)), 100) * 4
+        limite = max(maximo - len(observacion), maximo // 2)
+        if len(respuesta) > limite:
+            # Se conservan las acciones (desde el primer "Acción:") y lo que quepa del pensamiento
+            inicio = respuesta.find("Acción:")
+            acciones = respuesta[inicio:][:limite] if inicio >= 0 else ""
+            respuesta = respuesta[:limite - len(acciones)].rstrip() + " [...]\n" + acciones
+        limite = max(maximo - len(respuesta), 200)
+        if len(observacion) > limite:
+            observacion = observacion[:limite].rstrip() + " [...]"
+        return respuesta, observacion
+    
+    def _resumir(self, ciclos: List[Tuple[str, str]]) -> str:
+        pasos = "\n\n".join(f"Pensamiento: {respuesta.strip()}\nObservación: {observacion}" for respuesta, observacion in ciclos)
+        clave = self.resumen + "\n\n" + pasos
+        with _CERROJO_RESUMENES:
+            if clave in _CACHE_RESUMENES:
+                _CACHE_RESUMENES.move_to_end(clave)
+                return _CACHE_RESUMENES[clave]
+        previo = f"Resumen previo:\n{self.resumen}\n\n" if self.resumen else ""
+        prompt = f"""Resume los siguientes pasos de un proceso ReAct en un máximo de 5 frases. Conserva los datos concretos obtenidos (cifras, nombres, precios, resultados) y lo que queda por averiguar; omite el razonamiento intermedio.
+
+{previo}Pasos nuevos:
+{pasos}
+
+Resumen:"""
+        texto, error = self.generar(prompt)
+        resumen = texto.strip() if not error and texto.strip() else self._resumen_extractivo(ciclos)
+        with _CERROJO_RESUMENES:
+            _CACHE_RESUMENES[clave] = resumen
+            if len(_CACHE_RESUMENES) > _MAX_RESUMENES:
+                _CACHE_RESUMENES.popitem(last=False)
+        return resumen
+    
+    def _resumen_extractivo(self, ciclos: List[Tuple[str, str]]) -> str:
+        """Resumen sin modelo (si la llamada falla): cada acción con su observación."""
+        lineas = [self.resumen] if self.resumen else []
+        for respuesta, observacion in ciclos:
+            acciones = procesar_reacciones(respuesta)["accion"]
+            lineas.append(f"- {acciones[-1] if acciones else 'Sin acción'} -> {observacion}")
+        return "\n".join(lineas)
+
+class DetectorBucles:
+    """Detecta ciclos de ReAct que no aportan nada nuevo.
+    
+    Un ciclo no progresa si repite acciones ya ejecutadas (comparadas
+    normalizadas, como en la caché de observaciones) y obtiene la misma
+    observación, o si no propone ninguna acción. La repetición se comprueba
+    con el par (acciones, observación): acciones distintas que devuelven el
+    mismo aviso genérico (p. ej. una búsqueda sin resultados) sí cuentan como
+    progreso. Cada ciclo así se corrige con una indicación al modelo; si se
+    encadenan `limite` seguidos, el episodio se detiene sin agotar las
+    iteraciones.
+    """
+    CORRECCIONES = {
+        "accion_repetida": "Ya ejecutaste esta acción y su resultado no va a cambiar. No la repitas: usa la "
+                           "información que ya tienes, prueba una acción distinta o da la respuesta final.",
+        "sin_accion": "No has indicado ninguna acción. Escribe una línea \"Acción: ...\" o, si ya puedes "
+                      "responder, \"Acción: Respuesta final: ...\"."
+    }
+    DESCRIPCIONES = {
+        "accion_repetida": "acciones repetidas",
+        "sin_accion": "ciclos sin acción"
+    }
+    
+    def __init__(self, limite: int = 2):
+        self.limite = limite
+        self.ciclos: set = set()  # pares (acciones normalizadas, observación) ya vistos
+        self.seguidos = 0
+        self.detectados = 0
+    
+    def registrar(self, acciones: List[str], observacion: str) -> Optional[str]:
+        """Registra un ciclo y devuelve el motivo por el que no progresa, o None si aporta algo nuevo."""
+        ciclo = (tuple(sorted(CacheObservaciones.clave(accion) for accion in acciones)),
+                 observacion.replace(AVISO_RESULTADO_CONOCIDO, "").strip())
+        if not acciones:
+            motivo = "sin_accion"
+        elif ciclo in self.ciclos:
+            motivo = "accion_repetida"
+        else:
+            motivo = None
+            self.ciclos.add(ciclo)
+        self.seguidos = self.seguidos + 1 if motivo else 0
+        self.detectados += motivo is not None
+        return motivo
+    
+    def detener(self) -> bool:
+        return self.seguidos >= self.limite
+
+class EpisodioReAct:
+    """Estado de una ejecución de ReAct sobre un problema, que avanza ciclo a ciclo.
+    
+    La llamada al modelo la hace quien usa el episodio: `siguiente_prompt`
+    devuelve el prompt de la iteración y `avanzar` procesa la respuesta
+    (acciones, observaciones e historial). Así el mismo ciclo sirve para la
+    ejecución secuencial (`ejecutar_react`) y para la concurrente
+    (`ejecutar_react_concurrente`), en la que cada episodio conserva su
+    propio estado en orden. Con `limite_sin_progreso` (ver DetectorBucles)
+    los bucles se corrigen y, si persisten, terminan el episodio antes de
+    tiempo.
+    """
+    def __init__(self, prompt_base: str, problema: Dict[str, Any], generar_resumen: Callable[[str], Tuple[str, Optional[str]]],
+                 max_iteraciones: int = 5, herramientas: Optional[RegistroHerramientas] = None,
+                 acciones_paralelas: bool = False, max_tokens_contexto: Optional[int] = 3000, ciclos_literales: int = 3,
+                 cache: Optional[CacheObservaciones] = CACHE_OBSERVACIONES, mostrar: Callable[[str], None] = print,
+                 limite_sin_progreso: Optional[int] = 2):
+        self.problema = problema
+        self.max_iteraciones = max_iteraciones
+        self.herramientas = herramientas or HERRAMIENTAS
+        self.acciones_paralelas = acciones_paralelas
+        self.cache = cache
+        self.mostrar = mostrar
+        self.historial_prompt = HistorialReAct(prompt_base + "\n\n" + problema["descripcion"], generar_resumen,
+                                               max_tokens=max_tokens_contexto, ciclos_literales=ciclos_literales)
+        self.historial: List[Dict[str, Any]] = []
+        self.respuesta_final = ""
+        self.iteracion = 0
+        self.terminado = False
+        self.detector = DetectorBucles(limite_sin_progreso) if limite_sin_progreso else None
+        self.iteraciones_ahorradas = 0
+        self.inicio = time.perf_counter()
+        self.segundos = 0.0
+        # Métricas propias del episodio (las de HERRAMIENTAS y la caché son de todo el proceso)
+        self.acciones_ejecutadas = 0
+        self.acciones_en_cache = 0
+        self.segundos_herramientas = 0.0
+    
+    def parametros_llamada(self) -> Dict[str, Any]:
+        """Argumentos de la llamada al modelo que genera el siguiente pensamiento y acción."""
+        return {"temperatura": 0.7, "stop": SECUENCIAS_PARADA_REACT, "cortar_tras_accion": not self.acciones_paralelas}
+    
+    def siguiente_prompt(self) -> str:
+        self.iteracion += 1
+        self.mostrar(f"\n--- Iteración {self.iteracion}/{self.max_iteraciones} ---")
+        prompt = self.historial_prompt.prompt()
+        self.mostrar(f"📏 Prompt: ~{estimar_tokens(prompt)} tokens")
+        return prompt
+    
+    def avanzar(self, respuesta: str, error: Optional[str]) -> bool:
+        """Procesa la respuesta del modelo a `siguiente_prompt`; devuelve True si el episodio ha terminado."""
+        self.terminado = self._procesar(respuesta, error) or self.iteracion >= self.max_iteraciones
+        if self.terminado and not self.respuesta_final:
+            # Si llegamos al máximo de iteraciones sin respuesta final
+            self.respuesta_final = "Se alcanzó el máximo de iteraciones sin llegar a una respuesta definitiva."
+        return self.terminado
+    
+    def _procesar(self, respuesta: str, error: Optional[str]) -> bool:
         if error:
-            print(f"Error en la iteración {i+1}: {error}")
-            respuesta_final = "Error en el proceso de ReAct: " + error
-            break
+            self.mostrar(f"Error en la iteración {self.iteracion}: {error}")
+            self.respuesta_final = "Error en el proceso de ReAct: " + error
+            return True
         
         # Procesar la respuesta para extraer Pensamiento, Acción, etc.
         reacciones = procesar_reacciones(respuesta)
@@ -135,35 +1003,289 @@ def ejecutar_react(prompt_base: str, problema: Dict[str, Any], modelo: str, max_
         # Extraer el último pensamiento y acción si existen
         ultimo_pensamiento = reacciones["pensamiento"][-1] if reacciones["pensamiento"] else ""
         ultima_accion = reacciones["accion"][-1] if reacciones["accion"] else ""
+        acciones = [ultima_accion]
+        if self.acciones_paralelas:
+            # Si alguna acción es la respuesta final, se termina sin ejecutar las demás
+            acciones = extraer_acciones(respuesta)
+            acciones = [accion for accion in acciones if "respuesta final" in accion.lower()][-1:] or acciones
+            ultima_accion = "\n".join(acciones)
         
-        print(f"Pensamiento: {ultimo_pensamiento[:100]}..." if len(ultimo_pensamiento) > 100 else f"Pensamiento: {ultimo_pensamiento}")
-        print(f"Acción: {ultima_accion[:100]}..." if len(ultima_accion) > 100 else f"Acción: {ultima_accion}")
+        self.mostrar(f"Pensamiento: {ultimo_pensamiento[:100]}..." if len(ultimo_pensamiento) > 100 else f"Pensamiento: {ultimo_pensamiento}")
+        self.mostrar(f"Acción: {ultima_accion[:100]}..." if len(ultima_accion) > 100 else f"Acción: {ultima_accion}")
         
         # Registrar el ciclo actual
         ciclo_actual = {
-            "iteracion": i+1,
+            "iteracion": self.iteracion,
             "pensamiento": ultimo_pensamiento,
             "accion": ultima_accion,
             "respuesta_completa": respuesta
         }
+        if len(acciones) > 1:
+            ciclo_actual["acciones"] = acciones
         
         # Si no hay acción, considerar que hemos terminado
         if not ultima_accion or "respuesta final" in ultima_accion.lower():
-            print("Se encontró una respuesta final o no hay más acciones.")
-            respuesta_final = ultimo_pensamiento + "\n\n" + ultima_accion
+            self.mostrar("Se encontró una respuesta final o no hay más acciones.")
+            self.respuesta_final = ultimo_pensamiento + "\n\n" + ultima_accion
+            self.historial.append(ciclo_actual)
+            return True
+        
+        # Simular las observaciones de las acciones (a la vez si hay varias)
+        if len(acciones) > 1:
+            self.mostrar(f"Ejecutando {len(acciones)} acciones en paralelo...")
+        observacion = combinar_observaciones(acciones, self._ejecutar(acciones))
+        self.mostrar(f"Observación: {observacion}")
+        
+        # Detectar bucles: corregir al modelo o, si no progresa tras la corrección, detenerse
+        motivo = self.detector.registrar(acciones if ultima_accion else [], observacion) if self.detector else None
+        if motivo is not None:
+            ciclo_actual["sin_progreso"] = motivo
+            if self.detector.detener():
+                ciclo_actual["observacion"] = observacion
+                self.historial.append(ciclo_actual)
+                self.iteraciones_ahorradas = self.max_iteraciones - self.iteracion
+                self.respuesta_final = (f"Proceso detenido en la iteración {self.iteracion} por falta de progreso "
+                                        f"({DetectorBucles.DESCRIPCIONES[motivo]}).")
+                self.mostrar(f"⏹️ Sin progreso ({DetectorBucles.DESCRIPCIONES[motivo]}) tras la corrección: "
+                             f"se detiene el episodio ({self.iteraciones_ahorradas} iteración(es) ahorradas)")
+                return True
+            # Una sola indicación por ciclo: sin acción, la corrección sustituye al aviso genérico
+            correccion = DetectorBucles.CORRECCIONES[motivo]
+            observacion = correccion if motivo == "sin_accion" else observacion + "\n" + correccion
+            self.mostrar(f"↪️ Corrección ({DetectorBucles.DESCRIPCIONES[motivo]}): {DetectorBucles.CORRECCIONES[motivo]}")
+        
+        # Actualizar el ciclo actual con la observación
+        ciclo_actual["observacion"] = observacion
+        self.historial.append(ciclo_actual)
+        
+        # Actualizar el prompt para la siguiente iteración (compactándolo si hace falta)
+        self.historial_prompt.agregar(respuesta, observacion)
+        return False
+    
+    def _ejecutar(self, acciones: List[str]) -> List[str]:
+        """Ejecuta las acciones del ciclo y acumula las métricas del episodio."""
+        inicio = time.perf_counter()
+        observaciones = ejecutar_acciones(acciones, self.problema, self.herramientas, cache=self.cache)
+        self.segundos_herramientas += time.perf_counter() - inicio
+        self.acciones_ejecutadas += len(acciones)
+        self.acciones_en_cache += sum(AVISO_RESULTADO_CONOCIDO in observacion for observacion in observaciones)
+        return observaciones
+    
+    def cerrar(self) -> Tuple[str, List[Dict[str, Any]]]:
+        """Muestra las métricas del episodio y devuelve la respuesta final y el historial."""
+        self.segundos = time.perf_counter() - self.inicio
+        self.mostrar(f"\n📊 Acciones del episodio: {self.acciones_ejecutadas} ({self.acciones_en_cache} desde la caché), "
+                     f"{self.segundos_herramientas * 1000:.2f} ms en herramientas")
+        if self.detector is not None and self.detector.detectados:
+            ahorro = f"; {self.iteraciones_ahorradas} iteración(es) ahorradas (~{self.segundos / self.iteracion * self.iteraciones_ahorradas:.1f} s)" \
+                if self.iteraciones_ahorradas else ""
+            self.mostrar(f"🔁 Ciclos sin progreso: {self.detector.detectados}{ahorro}")
+        if self.historial_prompt.compactaciones:
+            self.mostrar(f"🗜️ Compactaciones del historial: {self.historial_prompt.compactaciones} "
+                         f"({self.historial_prompt.ciclos_resumidos} ciclo(s) resumidos)")
+        return self.respuesta_final, self.historial
+
+def mostrar_metricas_globales(herramientas: RegistroHerramientas, cache: Optional[CacheObservaciones]) -> None:
+    """Métricas acumuladas de las herramientas y la caché, compartidas por todos los episodios del proceso."""
+    print(f"\n📊 Herramientas (total del proceso): {herramientas.resumen_metricas()}")
+    if cache is not None:
+        print(f"💾 Caché de observaciones (total del proceso): {cache.resumen()}")
+
+def ejecutar_react(prompt_base: str, problema: Dict[str, Any], modelo: str, max_iteraciones: int = 5,
+                   herramientas: Optional[RegistroHerramientas] = None,
+                   acciones_paralelas: bool = False, max_tokens_contexto: Optional[int] = 3000,
+                   ciclos_literales: int = 3,
+                   cache: Optional[CacheObservaciones] = CACHE_OBSERVACIONES,
+                   limite_sin_progreso: Optional[int] = 2) -> Tuple[str, List[Dict[str, Any]]]:
+    """Ejecuta el ciclo ReAct con interacciones simuladas.
+    
+    Con `acciones_paralelas` se ejecutan a la vez todas las acciones que el
+    modelo proponga en una misma respuesta y se le devuelven juntas, en una
+    sola observación, en lugar de gastar una iteración por acción. El
+    historial se compacta (ver HistorialReAct) cuando el prompt supera
+    `max_tokens_contexto` tokens estimados. Las observaciones se comparten a
+    través de `cache` (la caché del proceso por defecto; None la desactiva).
+    Tras `limite_sin_progreso` ciclos seguidos sin progreso (acciones
+    repetidas con la misma observación, o sin acción) el proceso se detiene.
+    """
+    episodio = EpisodioReAct(prompt_base, problema, lambda prompt: llamar_ollama_api(prompt, modelo, temperatura=0.2, timeout=60),
+                             max_iteraciones, herramientas, acciones_paralelas, max_tokens_contexto, ciclos_literales, cache,
+                             limite_sin_progreso=limite_sin_progreso)
+    
+    while True:
+        # Obtener el siguiente pensamiento y acción del modelo
+        respuesta, error = llamar_ollama_api(episodio.siguiente_prompt(), modelo, **episodio.parametros_llamada())
+        if episodio.avanzar(respuesta, error):
+            break
+        
+        # Pequeña pausa entre iteraciones
+        time.sleep(1)
+    
+    resultado = episodio.cerrar()
+    mostrar_metricas_globales(episodio.herramientas, cache)
+    return resultado
+
+async def ejecutar_react_concurrente(prompt_base: str, problemas: List[Dict[str, Any]], modelo: str,
+                                     max_en_vuelo: int = 2, **opciones) -> List[Tuple[str, List[Dict[str, Any]]]]:
+    """Ejecuta a la vez un episodio de ReAct por problema con asyncio.
+    
+    Cada episodio avanza en orden con su propio EpisodioReAct (llamada al
+    modelo, después sus acciones), mientras un semáforo global limita a
+    `max_en_vuelo` las llamadas al modelo en curso, incluidas las de resumen
+    del historial. Las llamadas y el procesamiento de cada ciclo se ejecutan
+    en hilos, así que mientras un episodio ejecuta herramientas o analiza su
+    respuesta, otro ya tiene su llamada en el servidor. Los hilos son de un
+    ejecutor propio con un hilo por episodio más `max_en_vuelo`: el hilo que
+    procesa un ciclo puede quedar esperando a la llamada de resumen, que
+    necesita otro hilo, y con el ejecutor por defecto (de tamaño fijo) bastaría
+    con que compactaran a la vez tantos episodios como hilos tiene para que
+    nada avanzara. `opciones` son los argumentos de EpisodioReAct. Devuelve
+    (respuesta final, historial) de cada problema, en el mismo orden.
+    """
+    semaforo = asyncio.Semaphore(max_en_vuelo)
+    bucle = asyncio.get_running_loop()
+    ejecutor = ThreadPoolExecutor(max_workers=len(problemas) + max_en_vuelo)
+    en_vuelo = {"actual": 0, "maximo": 0}
+    
+    async def en_hilo(funcion: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        return await bucle.run_in_executor(ejecutor, lambda: funcion(*args, **kwargs))
+    
+    async def llamar_limitado(prompt: str, **parametros: Any) -> Tuple[str, Optional[str]]:
+        async with semaforo:
+            en_vuelo["actual"] += 1
+            en_vuelo["maximo"] = max(en_vuelo["maximo"], en_vuelo["actual"])
+            try:
+                return await en_hilo(llamar_ollama_api, prompt, modelo, **parametros)
+            finally:
+                en_vuelo["actual"] -= 1
+    
+    def generar_resumen(prompt: str) -> Tuple[str, Optional[str]]:
+        # Se llama desde el hilo que procesa el ciclo: la llamada se programa en el bucle para respetar el semáforo
+        return asyncio.run_coroutine_threadsafe(llamar_limitado(prompt, temperatura=0.2, timeout=60), bucle).result()
+    
+    async def ejecutar_episodio(problema: Dict[str, Any]) -> EpisodioReAct:
+        episodio = EpisodioReAct(prompt_base, problema, generar_resumen,
+                                 mostrar=lambda texto: print(f"[Problema {problema['id']}] {texto.strip()}"), **opciones)
+        while not episodio.terminado:
+            respuesta, error = await llamar_limitado(episodio.siguiente_prompt(), **episodio.parametros_llamada())
+            await en_hilo(episodio.avanzar, respuesta, error)
+        episodio.cerrar()
+        return episodio
+    
+    inicio = time.perf_counter()
+    try:
+        episodios = await asyncio.gather(*(ejecutar_episodio(problema) for problema in problemas))
+    finally:
+        ejecutor.shutdown(wait=False)
+    duracion = time.perf_counter() - inicio
+    
+    if episodios:
+        mostrar_metricas_globales(episodios[0].herramientas, opciones.get("cache", CACHE_OBSERVACIONES))
+    
+    print(f"\n⏱️ {len(episodios)} episodio(s) en {duracion:.1f} s (suma de sus duraciones: "
+          f"{sum(episodio.segundos for episodio in episodios):.1f} s); máximo de llamadas en vuelo: {en_vuelo['maximo']}/{max_en_vuelo}; "
+          f"iteraciones ahorradas por bucles: {sum(episodio.iteraciones_ahorradas for episodio in episodios)}")
+    return [(episodio.respuesta_final, episodio.historial) for episodio in episodios]
+
+def extraer_llamadas(mensaje: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any], Optional[str]]]:
+    """Devuelve (nombre, argumentos, id) de cada llamada a herramienta del mensaje del asistente."""
+    llamadas = []
+    for llamada in mensaje.get("tool_calls") or []:
+        funcion = llamada.get("function", {})
+        argumentos = funcion.get("arguments") or {}
+        if isinstance(argumentos, str):
+            # La API compatible con OpenAI envía los argumentos como texto JSON
+            try:
+                argumentos = json.loads(argumentos)
+            except json.JSONDecodeError:
+                argumentos = {}
+        llamadas.append((funcion.get("name", ""), argumentos if isinstance(argumentos, dict) else {}, llamada.get("id")))
+    return llamadas
+
+def ejecutar_llamadas(llamadas: List[Tuple[str, Dict[str, Any], Optional[str]]], problema: Dict[str, Any],
+                      herramientas: RegistroHerramientas, max_hilos: int = 4,
+                      cache: Optional[CacheObservaciones] = None) -> List[str]:
+    """Ejecuta a la vez las llamadas a herramientas y devuelve sus observaciones en el mismo orden."""
+    def ejecutar(llamada: Tuple[str, Dict[str, Any], Optional[str]]) -> str:
+        nombre, argumentos, _ = llamada
+        accion = f"{nombre} {' '.join(str(valor) for valor in argumentos.values())}"
+        return observar_con_cache(cache, accion, "llamada",
+                                  lambda: herramientas.ejecutar_llamada(nombre, argumentos, problema))
+    with ThreadPoolExecutor(max_workers=min(max_hilos, len(llamadas))) as ejecutor:
+        return list(ejecutor.map(ejecutar, llamadas))
+
+def ejecutar_react_nativo(problema: Dict[str, Any], modelo: str, max_iteraciones: int = 5,
+                          herramientas: Optional[RegistroHerramientas] = None,
+                          cache: Optional[CacheObservaciones] = CACHE_OBSERVACIONES) -> Tuple[str, List[Dict[str, Any]]]:
+    """Ejecuta el ciclo ReAct con llamadas nativas a herramientas (campo `tools` de la API de chat).
+    
+    Las acciones llegan como llamadas estructuradas en lugar de líneas
+    `Acción:`, así que no hay fallos de análisis que cuesten una iteración, y
+    la respuesta final es el mensaje en el que el modelo ya no llama a
+    ninguna herramienta. Si el servidor no admite herramientas (o las ignora
+    y responde con el formato de texto) se usa `ejecutar_react`.
+    """
+    herramientas = herramientas or HERRAMIENTAS
+    esquemas = herramientas.esquemas(problema)
+    mensajes = [
+        {"role": "system", "content": crear_prompt_sistema_nativo()},
+        {"role": "user", "content": problema["descripcion"]}
+    ]
+    historial = []
+    
+    respuesta_final = ""
+    
+    for i in range(max_iteraciones):
+        print(f"\n--- Iteración {i+1}/{max_iteraciones} ---")
+        
+        mensaje, error = llamar_ollama_chat(mensajes, modelo, esquemas, primera_llamada=i == 0)
+        
+        sin_soporte = error == ERROR_SIN_HERRAMIENTAS or (
+            not error and not mensaje.get("tool_calls") and "Acción:" in (mensaje.get("content") or ""))
+        if i == 0 and sin_soporte:
+            print("⚠️ El servidor no admite llamadas a herramientas; se usa el formato de texto de ReAct.")
+            return ejecutar_react(crear_prompt_react(), problema, modelo, max_iteraciones, herramientas, cache=cache)
+        
+        if error:
+            print(f"Error en la iteración {i+1}: {error}")
+            respuesta_final = "Error en el proceso de ReAct: " + error
+            break
+        
+        contenido = (mensaje.get("content") or "").strip()
+        llamadas = extraer_llamadas(mensaje)
+        acciones = [f"{nombre}: {', '.join(str(valor) for valor in argumentos.values())}" for nombre, argumentos, _ in llamadas]
+        
+        print(f"Pensamiento: {contenido[:100]}..." if len(contenido) > 100 else f"Pensamiento: {contenido}")
+        
+        ciclo_actual = {
+            "iteracion": i+1,
+            "pensamiento": contenido,
+            "accion": "\n".join(acciones),
+            "respuesta_completa": contenido
+        }
+        if len(acciones) > 1:
+            ciclo_actual["acciones"] = acciones
+        
+        # Sin llamadas a herramientas, el mensaje es la respuesta final
+        if not llamadas:
+            print("Se encontró una respuesta final.")
+            ciclo_actual["accion"] = "Respuesta final"
+            respuesta_final = contenido
             historial.append(ciclo_actual)
             break
         
-        # Simular una observación basada en la acción
-        observacion = simular_observacion(ultima_accion, problema)
+        print(f"Acción: {ciclo_actual['accion']}")
+        observaciones = ejecutar_llamadas(llamadas, problema, herramientas, cache=cache)
+        observacion = combinar_observaciones(acciones, observaciones)
         print(f"Observación: {observacion}")
         
-        # Actualizar el ciclo actual con la observación
         ciclo_actual["observacion"] = observacion
         historial.append(ciclo_actual)
         
-        # Actualizar el prompt para la siguiente iteración
-        prompt_completo += f"\n{respuesta}\nObservación: {observacion}\n\nPensamiento:"
+        # Devolver al modelo su mensaje y una respuesta de herramienta por llamada
+        mensajes.append({"role": "assistant", "content": contenido, "tool_calls": mensaje["tool_calls"]})
+        for (nombre, _, id_llamada), observacion in zip(llamadas, observaciones):
+            mensajes.append({"role": "tool", "tool_name": nombre, "content": observacion})
         
         # Pequeña pausa entre iteraciones
         time.sleep(1)
@@ -172,11 +1294,17 @@ def ejecutar_react(prompt_base: str, problema: Dict[str, Any], modelo: str, max_
     if i == max_iteraciones - 1 and not respuesta_final:
         respuesta_final = "Se alcanzó el máximo de iteraciones sin llegar a una respuesta definitiva."
     
+    mostrar_metricas_globales(herramientas, cache)
+    
     return respuesta_final, historial
 
-def crear_prompt_react() -> str:
+def crear_prompt_react(acciones_paralelas: bool = False) -> str:
     """Crea un prompt base para la técnica ReAct."""
-    return """# Instrucciones para el método ReAct (Reasoning + Acting)
+    seccion_paralela = """
+## Acciones en paralelo:
+Si necesitas varias consultas independientes entre sí (por ejemplo, buscar vuelos, trenes y hoteles), escríbelas seguidas en la misma respuesta, una por línea y cada una con su propio "Acción:". Se ejecutarán a la vez y recibirás una única Observación con los resultados numerados en el mismo orden. No mezcles en el mismo paso otras acciones con la respuesta final.
+""" if acciones_paralelas else ""
+    return f"""# Instrucciones para el método ReAct (Reasoning + Acting)
 
 Tu tarea es resolver problemas utilizando la metodología ReAct, que alterna entre razonamiento y acciones.
 Debes seguir este formato específico:
@@ -189,10 +1317,10 @@ Continúa este ciclo hasta resolver completamente el problema. Cuando tengas la
 
 ## Ejemplos de acciones posibles:
 - Buscar información específica
-- Calcular una operación matemática
+- Calcular una operación matemática escribiendo la expresión (por ejemplo: Calcular (6 * 8) / 2 o Calcular pi * 5^2)
 - Analizar datos proporcionados
 - Desglosar un problema complejo en partes más simples
-
+{seccion_paralela}
 ## Ejemplo:
 
 Problema: ¿Cuál es la capital de Francia y su población aproximada?
@@ -210,6 +1338,13 @@ Acción: Respuesta final: La capital de Francia es París, con una población de
 
 ## Ahora resuelve el siguiente problema usando el método ReAct:"""
 
+def crear_prompt_sistema_nativo() -> str:
+    """Crea las instrucciones de sistema para ReAct con llamadas nativas a herramientas."""
+    return """Resuelve el problema del usuario alternando razonamiento y acciones (método ReAct).
+- Antes de usar una herramienta, explica en una o dos frases qué información necesitas y por qué.
+- Obtén los datos que te falten llamando a las herramientas disponibles; si las consultas son independientes, puedes hacer varias llamadas a la vez.
+- Cuando tengas toda la información, responde con la respuesta final completa, sin llamar a más herramientas."""
+
 def crear_problemas_demo() -> List[Dict[str, Any]]:
     """Crea una lista de problemas de demostración para ReAct."""
     return [
@@ -260,6 +1395,10 @@ def guardar_resultado(resultado: str, historial: List[Dict[str, Any]], problema_
         f.write(f"\n## Respuesta Final\n{resultado}")
 
 if __name__ == '__main__':
+    if "--benchmark-analizador" in sys.argv:
+        comparar_analizadores()
+        sys.exit(0)
+    
     print("=== Demostración de ReAct con Ollama ===")
     print("Verificando que el servidor de Ollama esté en ejecución...")
     
@@ -308,9 +1447,6 @@ if __name__ == '__main__':
         
     print(f"\nUsando modelo: {modelo_seleccionado}")
     
-    # Crear prompt base para ReAct
-    prompt_base = crear_prompt_react()
-    
     # Obtener lista de problemas demo
     problemas = crear_problemas_demo()
     
@@ -320,8 +1456,9 @@ if __name__ == '__main__':
         print(f"{problema['id']}. {problema['descripcion']} (Dificultad: {problema['dificultad']})")
     
     # Permitir selección del problema o usar uno por defecto
-    seleccion = input("\nSelecciona un número de problema (o presiona Enter para usar el primero): ").strip()
+    seleccion = input("\nSelecciona un número de problema (Enter para el primero, 't' para resolverlos todos a la vez): ").strip()
     problema_seleccionado = None
+    todos = seleccion.lower() == "t"
     
     if seleccion and seleccion.isdigit():
         id_seleccionado = int(seleccion)
@@ -333,28 +1470,76 @@ if __name__ == '__main__':
     if not problema_seleccionado:
         problema_seleccionado = problemas[0]
     
-    print(f"\nResolviendo problema: {problema_seleccionado['descripcion']}")
+    if todos:
+        print(f"\nResolviendo los {len(problemas)} problemas a la vez")
+    else:
+        print(f"\nResolviendo problema: {problema_seleccionado['descripcion']}")
     
     # Número máximo de iteraciones
     max_iteraciones = 5
     print(f"Máximo de iteraciones configurado: {max_iteraciones}")
     
+    # Llamadas simultáneas al modelo cuando se resuelven todos los problemas a la vez
+    max_en_vuelo = 2
+    if todos:
+        print(f"Máximo de llamadas al modelo en vuelo: {max_en_vuelo}")
+    
+    # Motor de ReAct: llamadas nativas a herramientas o formato de texto
+    modo_nativo = not todos and input("¿Usar llamadas nativas a herramientas (API de chat con tools)? (s/N): ").strip().lower() == "s"
+    
+    # Modo de acciones en paralelo (varias consultas independientes por paso)
+    acciones_paralelas = not modo_nativo and input(
+        "¿Ejecutar en paralelo las acciones independientes de cada paso? (s/N): ").strip().lower() == "s"
+    
+    # Caché de observaciones: solo en memoria o también en disco entre ejecuciones
+    if input("¿Guardar la caché de observaciones en disco? (s/N): ").strip().lower() == "s":
+        cache = CacheObservaciones(ruta=os.path.join("resultados_react", "cache_observaciones.json"))
+    else:
+        cache = CACHE_OBSERVACIONES
+    
+    # Crear prompt base para ReAct
+    prompt_base = crear_prompt_react(acciones_paralelas)
+    
     # Ejecutar ReAct
     print("\nIniciando proceso ReAct...")
-    respuesta_final, historial = ejecutar_react(
-        prompt_base, 
-        problema_seleccionado, 
-        modelo_seleccionado, 
-        max_iteraciones
-    )
-    
-    # Mostrar resultado final
-    print("\n=== Resultado Final ===")
-    print(respuesta_final)
-    
-    # Guardar resultados
-    print("\nGuardando resultados...")
-    guardar_resultado(respuesta_final, historial, problema_seleccionado["id"])
-    
-    print(f"\nResultados guardados en la carpeta 'resultados_react'")
+    if todos:
+        resultados = asyncio.run(ejecutar_react_concurrente(
+            prompt_base,
+            problemas,
+            modelo_seleccionado,
+            max_en_vuelo=max_en_vuelo,
+            max_iteraciones=max_iteraciones,
+            acciones_paralelas=acciones_paralelas,
+            cache=cache
+        ))
+    elif modo_nativo:
+        resultados = [ejecutar_react_nativo(
+            problema_seleccionado, 
+            modelo_seleccionado, 
+            max_iteraciones,
+            cache=cache
+        )]
+    else:
+        resultados = [ejecutar_react(
+            prompt_base, 
+            problema_seleccionado, 
+            modelo_seleccionado, 
+            max_iteraciones,
+            acciones_paralelas=acciones_paralelas,
+            cache=cache
+        )]
+    
+    for problema, (respuesta_final, historial) in zip(problemas if todos else [problema_seleccionado], resultados):
+        print(f"\nIteraciones usadas: {len(historial)} "
+              f"(acciones ejecutadas: {sum(len(ciclo.get('acciones', [ciclo['accion']])) for ciclo in historial if 'observacion' in ciclo)})")
+        
+        # Mostrar resultado final
+        print(f"\n=== Resultado Final (problema {problema['id']}) ===")
+        print(respuesta_final)
+        
+        # Guardar resultados
+        print("\nGuardando resultados...")
+        guardar_resultado(respuesta_final, historial, problema["id"])
+    
+    print("\nResultados guardados en la carpeta 'resultados_react'")
     print("¡Demostración de ReAct completada!")
\ No newline at end of file
@@ -3,19 +3,180 @@ import json
 import time
 import random
 import heapq
-from collections import deque, defaultdict
+from collections import deque, defaultdict, OrderedDict
 import re
 import os
+import sys
+import math
+import zlib
+import hashlib
+import copy
+import queue
+import threading
+import sqlite3
+import tempfile
+import unicodedata
 
-def llamar_lmstudio_api(prompt, modelo="local model", temperatura=0.7, timeout=60):
-    """Llama a la API REST de LM Studio para generar una respuesta."""
-    url = "http://localhost:1234/v1/completions"
+class PresupuestoBusqueda:
+    """Límites globales de una búsqueda ToT: llamadas al modelo, tokens generados y tiempo.
+    
+    Cualquier límite puede ser None (sin límite). El reloj empieza con la primera
+    consulta, no al crear el objeto, para no contar el tiempo de los menús.
+    """
+    def __init__(self, max_llamadas=None, max_tokens=None, limite_segundos=None):
+        self.max_llamadas = max_llamadas
+        self.max_tokens = max_tokens
+        self.limite_segundos = limite_segundos
+        self.inicio = None
+        self.llamadas = 0
+        self.tokens_prompt = 0
+        self.tokens_generados = 0
+        self.motivo = None
+        self._lock = threading.RLock()
+        # Telemetría de reutilización de prefijos (caché de prompts del servidor)
+        self.tokens_cacheados = 0
+        self.caracteres_prompt = 0
+        self.caracteres_reutilizables = 0
+        self._prompts_recientes = deque(maxlen=8)
+    
+    def _iniciar(self):
+        if self.inicio is None:
+            self.inicio = time.time()
+    
+    def segundos_transcurridos(self):
+        return 0.0 if self.inicio is None else time.time() - self.inicio
+    
+    def tiempo_restante(self):
+        if self.limite_segundos is None:
+            return None
+        return self.limite_segundos - self.segundos_transcurridos()
+    
+    def tokens_restantes(self):
+        if self.max_tokens is None:
+            return None
+        return self.max_tokens - self.tokens_generados
+    
+    def agotado(self):
+        """Indica si se alcanzó algún límite (y guarda el motivo)."""
+        with self._lock:
+            self._iniciar()
+            if self.motivo:
+                return True
+            if self.max_llamadas is not None and self.llamadas >= self.max_llamadas:
+                self.motivo = f"límite de llamadas ({self.max_llamadas})"
+            elif self.max_tokens is not None and self.tokens_generados >= self.max_tokens:
+                self.motivo = f"límite de tokens ({self.max_tokens})"
+            elif self.limite_segundos is not None and self.tiempo_restante() <= 0:
+                self.motivo = f"límite de tiempo ({self.limite_segundos}s)"
+            return self.motivo is not None
+    
+    def reservar_llamada(self):
+        """Contabiliza una llamada al modelo (aunque luego falle) si queda presupuesto.
+        
+        La comprobación y el conteo son atómicos, para que varios hilos no
+        superen juntos el límite de llamadas.
+        """
+        with self._lock:
+            if self.agotado():
+                return False
+            self.llamadas += 1
+            return True
+    
+    def registrar(self, tokens_prompt, tokens_generados, tokens_cacheados=0):
+        """Contabiliza los tokens consumidos por una llamada (y los que el servidor sirvió desde su caché)."""
+        with self._lock:
+            self.tokens_prompt += tokens_prompt
+            self.tokens_generados += tokens_generados
+            self.tokens_cacheados += tokens_cacheados
+    
+    def registrar_prompt(self, prompt):
+        """Mide qué parte del prompt comparte prefijo con alguno de los últimos enviados.
+        
+        Es una cota de lo que puede reutilizar la caché de prefijos del
+        servidor, que conserva el KV de las peticiones recientes.
+        """
+        with self._lock:
+            comun = max((len(os.path.commonprefix([prompt, previo])) for previo in self._prompts_recientes), default=0)
+            self.caracteres_prompt += len(prompt)
+            self.caracteres_reutilizables += comun
+            self._prompts_recientes.append(prompt)
+    
+    def resumen(self):
+        limite = lambda valor: "∞" if valor is None else valor
+        texto = (f"Llamadas: {self.llamadas}/{limite(self.max_llamadas)}, "
+                 f"tokens generados: {self.tokens_generados}/{limite(self.max_tokens)}, "
+                 f"tokens de prompt: {self.tokens_prompt}, "
+                 f"tiempo: {self.segundos_transcurridos():.1f}s/{limite(self.limite_segundos)}s")
+        if self.caracteres_prompt:
+            texto += f", prefijo común con prompts recientes: {100 * self.caracteres_reutilizables / self.caracteres_prompt:.0f}%"
+        if self.tokens_cacheados:
+            texto += f", tokens de prompt servidos desde caché: {self.tokens_cacheados}"
+        if self.motivo:
+            texto += f" (detenido por {self.motivo})"
+        return texto
+
+class CriterioParada:
+    """Reglas de parada anticipada de una búsqueda ToT.
+    
+    - `puntuacion_objetivo`: la búsqueda termina en cuanto una solución
+      completa alcanza esa puntuación; el resto del árbol no se explora.
+    - `margen_dominancia`: si el mejor de un grupo de hermanos supera a todos
+      los demás por al menos ese margen, solo se sigue por él y los subárboles
+      de los demás se cancelan antes de generarlos.
+    """
+    def __init__(self, puntuacion_objetivo=None, margen_dominancia=None):
+        self.puntuacion_objetivo = puntuacion_objetivo
+        self.margen_dominancia = margen_dominancia
+        self.motivo = None
+        self.podados = 0
+    
+    def detenido(self):
+        return self.motivo is not None
+    
+    def registrar_solucion(self, puntuacion):
+        """Anota una solución completa y devuelve True si con ella se alcanza el objetivo."""
+        if not self.motivo and self.puntuacion_objetivo is not None and puntuacion >= self.puntuacion_objetivo:
+            self.motivo = f"solución con {puntuacion}/10 (objetivo: {self.puntuacion_objetivo}/10)"
+        return self.detenido()
+    
+    def filtrar_dominados(self, candidatos):
+        """Devuelve solo el mejor candidato (puntuacion, nodo) si domina a sus hermanos; si no, todos."""
+        if self.margen_dominancia is None or len(candidatos) < 2:
+            return candidatos
+        ordenados = sorted(candidatos, key=lambda x: x[0], reverse=True)
+        if ordenados[0][0] - ordenados[1][0] < self.margen_dominancia:
+            return candidatos
+        self.podados += len(candidatos) - 1
+        print(f"✂️ {ordenados[0][0]}/10 supera a sus hermanos por {ordenados[0][0] - ordenados[1][0]:g} puntos: "
+              f"se cancelan {len(candidatos) - 1} subárbol(es)")
+        return ordenados[:1]
+
+# Servidor de LM Studio por defecto (se puede cambiar por búsqueda con ContextoBusqueda.url_base)
+URL_LMSTUDIO = "http://localhost:1234"
+
+def llamar_lmstudio_api(prompt, modelo="local model", temperatura=0.7, timeout=60, presupuesto=None, url_base=URL_LMSTUDIO):
+    """Llama a la API REST de LM Studio para generar una respuesta.
+    
+    Si se pasa un `presupuesto`, la llamada se rechaza cuando está agotado y
+    `max_tokens`/`timeout` se recortan a lo que queda disponible.
+    """
+    url = f"{url_base}/v1/completions"
+    
+    max_tokens = 1000
+    if presupuesto is not None:
+        if not presupuesto.reservar_llamada():
+            return "", f"Presupuesto agotado: {presupuesto.motivo}"
+        if presupuesto.tokens_restantes() is not None:
+            max_tokens = max(1, min(max_tokens, presupuesto.tokens_restantes()))
+        if presupuesto.tiempo_restante() is not None:
+            timeout = max(1, min(timeout, int(presupuesto.tiempo_restante())))
+        presupuesto.registrar_prompt(prompt)
     
     payload = {
         "prompt": prompt,
-        "model": "gemma-3-4b-it",
+        "model": modelo,
         "temperature": temperatura,
-        "max_tokens": 1000,
+        "max_tokens": max_tokens,
         "stream": False
     }
     
@@ -29,7 +190,13 @@ def llamar_lmstudio_api(prompt, modelo="local model", temperatura=0.7, timeout=6
         
         if response.status_code == 200:
             result = response.json()
-            return result.get("choices", [{}])[0].get("text", ""), None
+            texto = result.get("choices", [{}])[0].get("text", "")
+            if presupuesto is not None:
+                uso = result.get("usage", {})
+                presupuesto.registrar(uso.get("prompt_tokens", len(prompt) // 4),
+                                      uso.get("completion_tokens", len(texto) // 4),
+                                      (uso.get("prompt_tokens_details") or {}).get("cached_tokens", 0))
+            return texto, None
         else:
             error_msg = f"Error en la API: {response.status_code} - {response.text}"
             print(error_msg)
@@ -38,14 +205,14 @@ def llamar_lmstudio_api(prompt, modelo="local model", temperatura=0.7, timeout=6
     except requests.exceptions.Timeout:
         return "", f"Timeout después de {timeout} segundos"
     except requests.exceptions.ConnectionError:
-        return "", "Error de conexión. Verifica que LM Studio esté en ejecución en localhost:1234"
+        return "", f"Error de conexión. Verifica que LM Studio esté en ejecución en {url_base}"
     except Exception as e:
         return "", f"Error inesperado: {str(e)}"
 
-def verificar_modelos_disponibles():
+def verificar_modelos_disponibles(url_base=URL_LMSTUDIO):
     """Verifica la conexión con LM Studio."""
     try:
-        response = requests.get("http://localhost:1234/v1/models", timeout=10)
+        response = requests.get(f"{url_base}/v1/models", timeout=10)
         if response.status_code == 200:
             models = response.json().get("data", [])
             return [model["id"] for model in models]
@@ -57,11 +224,754 @@ def verificar_modelos_disponibles():
         print("No se pudo conectar con LM Studio. Usando 'local model' como valor predeterminado.")
         return ["local model"]  # Valor por defecto en caso de error
 
-def dividir_en_pasos(problema):
-    """Divide un problema en pasos específicos usando el modelo."""
-    prompt = f"""Necesito dividir el siguiente problema en 3-4 pasos clave para resolverlo:
+def llamar_lmstudio_api_logprobs(prompt, modelo="local model", top_logprobs=10, timeout=60, presupuesto=None,
+                                 url_base=URL_LMSTUDIO):
+    """Pide a LM Studio un único token y devuelve sus alternativas más probables.
+    
+    Devuelve un diccionario {token: logprob} (vacío si el servidor no soporta
+    logprobs) y un posible mensaje de error.
+    """
+    url = f"{url_base}/v1/completions"
+    
+    if presupuesto is not None:
+        if not presupuesto.reservar_llamada():
+            return {}, f"Presupuesto agotado: {presupuesto.motivo}"
+        if presupuesto.tiempo_restante() is not None:
+            timeout = max(1, min(timeout, int(presupuesto.tiempo_restante())))
+        presupuesto.registrar_prompt(prompt)
+    
+    payload = {
+        "prompt": prompt,
+        "model": modelo,
+        "temperature": 0,
+        "max_tokens": 1,
+        "logprobs": top_logprobs,
+        "stream": False
+    }
+    
+    try:
+        print(f"Enviando solicitud de logprobs a LM Studio (modelo: {modelo}, timeout: {timeout}s)...")
+        response = requests.post(url, json=payload, headers={"Content-Type": "application/json"}, timeout=timeout)
+        
+        if response.status_code != 200:
+            return {}, f"Error en la API: {response.status_code} - {response.text}"
+        
+        result = response.json()
+        if presupuesto is not None:
+            uso = result.get("usage", {})
+            presupuesto.registrar(uso.get("prompt_tokens", len(prompt) // 4), uso.get("completion_tokens", 1),
+                                  (uso.get("prompt_tokens_details") or {}).get("cached_tokens", 0))
+        
+        logprobs = result.get("choices", [{}])[0].get("logprobs") or {}
+        # Formato de completions: top_logprobs = [{token: logprob}, ...]
+        if logprobs.get("top_logprobs"):
+            return dict(logprobs["top_logprobs"][0]), None
+        # Formato tipo chat: content = [{token, logprob, top_logprobs: [{token, logprob}]}]
+        if logprobs.get("content"):
+            alternativas = logprobs["content"][0].get("top_logprobs", [])
+            return {alt["token"]: alt["logprob"] for alt in alternativas}, None
+        return {}, None
+    
+    except requests.exceptions.Timeout:
+        return {}, f"Timeout después de {timeout} segundos"
+    except requests.exceptions.ConnectionError:
+        return {}, f"Error de conexión. Verifica que LM Studio esté en ejecución en {url_base}"
+    except Exception as e:
+        return {}, f"Error inesperado: {str(e)}"
+
+def llamar_lmstudio_api_estructurada(prompt, modelo, esquema, nombre_esquema, temperatura=0.3, timeout=60, presupuesto=None,
+                                     url_base=URL_LMSTUDIO):
+    """Llama a LM Studio con `response_format` de tipo JSON schema y valida la respuesta.
+    
+    Devuelve los datos ya validados contra `esquema` (o None) y un posible error.
+    """
+    url = f"{url_base}/v1/chat/completions"
+    
+    if presupuesto is not None:
+        if not presupuesto.reservar_llamada():
+            return None, f"Presupuesto agotado: {presupuesto.motivo}"
+        if presupuesto.tiempo_restante() is not None:
+            timeout = max(1, min(timeout, int(presupuesto.tiempo_restante())))
+        presupuesto.registrar_prompt(prompt)
+    
+    payload = {
+        "model": modelo,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": temperatura,
+        "max_tokens": 1000,
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": nombre_esquema, "strict": True, "schema": esquema}
+        },
+        "stream": False
+    }
+    
+    try:
+        print(f"Enviando solicitud estructurada a LM Studio (modelo: {modelo}, esquema: {nombre_esquema}, timeout: {timeout}s)...")
+        response = requests.post(url, json=payload, headers={"Content-Type": "application/json"}, timeout=timeout)
+        
+        if response.status_code != 200:
+            return None, f"Error en la API: {response.status_code} - {response.text}"
+        
+        result = response.json()
+        contenido = result.get("choices", [{}])[0].get("message", {}).get("content", "")
+        if presupuesto is not None:
+            uso = result.get("usage", {})
+            presupuesto.registrar(uso.get("prompt_tokens", len(prompt) // 4),
+                                  uso.get("completion_tokens", len(contenido) // 4),
+                                  (uso.get("prompt_tokens_details") or {}).get("cached_tokens", 0))
+        return interpretar_json_estructurado(contenido, esquema)
+    
+    except requests.exceptions.Timeout:
+        return None, f"Timeout después de {timeout} segundos"
+    except requests.exceptions.ConnectionError:
+        return None, f"Error de conexión. Verifica que LM Studio esté en ejecución en {url_base}"
+    except Exception as e:
+        return None, f"Error inesperado: {str(e)}"
+
+class ContextoBusqueda:
+    """Todo lo que una búsqueda ToT necesita para consultar al modelo, en un solo objeto.
+    
+    Reúne el modelo, el servidor (`url_base`), los parámetros de muestreo y los
+    objetos propios de la búsqueda: presupuesto, checkpoint (`registro`),
+    caché de descomposiciones y criterio de parada. Se pasa explícitamente a
+    todas las funciones en lugar de leer variables globales, así que varias
+    búsquedas con modelos o servidores distintos pueden ejecutarse a la vez en
+    hilos separados. Cada búsqueda necesita su propio contexto (el presupuesto,
+    el registro y el criterio no se comparten); la caché de descomposiciones
+    sí puede compartirse porque es segura entre hilos.
+    """
+    def __init__(self, modelo="local model", url_base=URL_LMSTUDIO, presupuesto=None, registro=None, cache_pasos=None,
+                 criterio=None, modo_evaluacion="texto", salida_estructurada=False, umbral_duplicados=0.85,
+                 temperatura_evaluacion=0.3):
+        self.modelo = modelo
+        self.url_base = url_base
+        self.presupuesto = presupuesto
+        self.registro = registro
+        self.cache_pasos = cache_pasos
+        self.criterio = criterio
+        self.modo_evaluacion = modo_evaluacion
+        self.salida_estructurada = salida_estructurada
+        self.umbral_duplicados = umbral_duplicados
+        self.temperatura_evaluacion = temperatura_evaluacion
+    
+    def derivar(self, **cambios):
+        """Copia el contexto cambiando algunos campos (p. ej. un presupuesto nuevo para otra búsqueda)."""
+        nuevo = copy.copy(self)
+        for campo, valor in cambios.items():
+            if not hasattr(nuevo, campo):
+                raise AttributeError(f"ContextoBusqueda no tiene el campo '{campo}'")
+            setattr(nuevo, campo, valor)
+        return nuevo
+    
+    def configuracion(self):
+        """Campos que determinan el resultado de cada llamada (se guardan en la cabecera del checkpoint)."""
+        return {"modelo": self.modelo, "url_base": self.url_base, "modo_evaluacion": self.modo_evaluacion,
+                "salida_estructurada": self.salida_estructurada, "umbral_duplicados": self.umbral_duplicados,
+                "temperatura_evaluacion": self.temperatura_evaluacion}
+    
+    def llamar(self, prompt, temperatura, timeout=60, con_presupuesto=True):
+        return llamar_lmstudio_api(prompt, self.modelo, temperatura=temperatura, timeout=timeout,
+                                   presupuesto=self.presupuesto if con_presupuesto else None, url_base=self.url_base)
+    
+    def llamar_logprobs(self, prompt, top_logprobs=10):
+        return llamar_lmstudio_api_logprobs(prompt, self.modelo, top_logprobs=top_logprobs, presupuesto=self.presupuesto,
+                                            url_base=self.url_base)
+    
+    def llamar_estructurada(self, prompt, esquema, nombre_esquema, temperatura=None):
+        if temperatura is None:
+            temperatura = self.temperatura_evaluacion
+        return llamar_lmstudio_api_estructurada(prompt, self.modelo, esquema, nombre_esquema, temperatura=temperatura,
+                                                presupuesto=self.presupuesto, url_base=self.url_base)
+    
+    def agotado(self):
+        return self.presupuesto is not None and self.presupuesto.agotado()
+    
+    def detenido(self):
+        return self.criterio is not None and self.criterio.detenido()
+
+# Esquemas JSON para las salidas estructuradas
+ESQUEMA_PASOS = {
+    "type": "object",
+    "properties": {
+        "pasos": {
+            "type": "array",
+            "minItems": 1,
+            "maxItems": 6,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "nombre": {"type": "string", "minLength": 1},
+                    "descripcion": {"type": "string", "minLength": 1},
+                    "determinar": {"type": "string"}
+                },
+                "required": ["nombre", "descripcion", "determinar"]
+            }
+        }
+    },
+    "required": ["pasos"]
+}
+
+ESQUEMA_EVALUACION = {
+    "type": "object",
+    "properties": {
+        "puntuacion": {"type": "integer", "minimum": 1, "maximum": 10},
+        "justificacion": {"type": "string"}
+    },
+    "required": ["puntuacion", "justificacion"]
+}
+
+ESQUEMA_PENSAMIENTO_PUNTUADO = {
+    "type": "object",
+    "properties": {
+        "pensamiento": {"type": "string", "minLength": 1},
+        "puntuacion": {"type": "integer", "minimum": 1, "maximum": 10}
+    },
+    "required": ["pensamiento", "puntuacion"]
+}
+
+def validar_esquema(valor, esquema, ruta="respuesta"):
+    """Valida `valor` contra el subconjunto de JSON schema que usamos.
+    
+    Admite object/array/string/integer/number con required, minItems/maxItems,
+    minLength y minimum/maximum. Devuelve None si es válido o el primer error.
+    """
+    tipo = esquema.get("type")
+    
+    if tipo == "object":
+        if not isinstance(valor, dict):
+            return f"{ruta}: se esperaba un objeto"
+        for campo in esquema.get("required", []):
+            if campo not in valor:
+                return f"{ruta}: falta el campo '{campo}'"
+        for campo, subesquema in esquema.get("properties", {}).items():
+            if campo in valor:
+                error = validar_esquema(valor[campo], subesquema, f"{ruta}.{campo}")
+                if error:
+                    return error
+    elif tipo == "array":
+        if not isinstance(valor, list):
+            return f"{ruta}: se esperaba una lista"
+        if len(valor) < esquema.get("minItems", 0):
+            return f"{ruta}: se esperaban al menos {esquema['minItems']} elementos"
+        if "maxItems" in esquema and len(valor) > esquema["maxItems"]:
+            return f"{ruta}: se esperaban como máximo {esquema['maxItems']} elementos"
+        for i, elemento in enumerate(valor):
+            error = validar_esquema(elemento, esquema.get("items", {}), f"{ruta}[{i}]")
+            if error:
+                return error
+    elif tipo == "string":
+        if not isinstance(valor, str):
+            return f"{ruta}: se esperaba un texto"
+        if len(valor.strip()) < esquema.get("minLength", 0):
+            return f"{ruta}: texto demasiado corto"
+    elif tipo in ("integer", "number"):
+        if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+            return f"{ruta}: se esperaba un número"
+        if tipo == "integer" and valor != int(valor):
+            return f"{ruta}: se esperaba un entero"
+        if "minimum" in esquema and valor < esquema["minimum"]:
+            return f"{ruta}: valor menor que {esquema['minimum']}"
+        if "maximum" in esquema and valor > esquema["maximum"]:
+            return f"{ruta}: valor mayor que {esquema['maximum']}"
+    
+    return None
+
+def interpretar_json_estructurado(contenido, esquema):
+    """Convierte el texto JSON devuelto por el modelo y lo valida contra `esquema`."""
+    try:
+        datos = json.loads(contenido)
+    except json.JSONDecodeError as e:
+        return None, f"La respuesta no es JSON válido: {e}"
+    
+    error = validar_esquema(datos, esquema)
+    if error:
+        return None, f"La respuesta no cumple el esquema: {error}"
+    return datos, None
+
+# Texto de sistema con el que empiezan todos los prompts de la búsqueda
+PROMPT_SISTEMA = "Eres un asistente experto en resolver problemas razonando paso a paso con el método Tree of Thoughts."
+
+def construir_prompt(problema, tarea, historial_texto=None, titulo_historial="Pasos previos"):
+    """Construye un prompt con el contenido compartido al principio y la tarea al final.
+    
+    Sistema, problema e historial del camino forman un prefijo idéntico en
+    todas las llamadas sobre el mismo nodo (generar sus hijos, evaluarlo,
+    sintetizarlo) y un prefijo común con las de sus hermanos. Así la caché de
+    prefijos del servidor reutiliza ese prefill y solo procesa la tarea.
+    Con `historial_texto=None` se omite la sección del historial.
+    """
+    prompt = f'{PROMPT_SISTEMA}\n\nProblema: "{problema}"\n\n'
+    if historial_texto is not None:
+        prompt += f"{titulo_historial}:\n{historial_texto or 'Ninguno todavía.'}\n\n"
+    return prompt + tarea
+
+def formatear_paso(numero, nombre, pensamiento):
+    """Da formato a un paso del historial tal como aparece en los prompts."""
+    return f"PASO {numero}: {nombre}\nPensamiento: {pensamiento}\n\n"
+
+def formatear_historial(historia_pasos):
+    """Construye el texto del historial a partir de una lista de pasos."""
+    return "".join(formatear_paso(i + 1, paso['nombre'], paso['pensamiento']) for i, paso in enumerate(historia_pasos))
+
+class NodoPensamiento:
+    """Nodo del árbol de pensamientos. Solo guarda su propio paso y el índice de su padre."""
+    __slots__ = ("padre", "profundidad", "nombre", "pensamiento", "evaluacion", "justificacion", "fusionados",
+                 "hijos", "expansiones", "visitas", "valor_total", "clave", "resumen")
+
+    def __init__(self, padre, profundidad, nombre, pensamiento, clave="r"):
+        self.padre = padre
+        self.clave = clave  # camino de intentos desde la raíz, estable entre ejecuciones
+        self.profundidad = profundidad
+        self.nombre = nombre
+        self.pensamiento = pensamiento
+        self.evaluacion = None
+        self.justificacion = None
+        self.fusionados = 0  # hermanos casi idénticos fusionados en este nodo
+        self.resumen = None  # resumen acumulado del camino raíz→nodo (evaluación incremental)
+        self.hijos = []
+        # Estadísticas usadas por MCTS
+        self.expansiones = 0
+        self.visitas = 0
+        self.valor_total = 0.0
+
+class ArbolPensamientos:
+    """Almacén compacto de nodos con punteros al padre.
+
+    En lugar de copiar la lista completa de pasos en cada expansión, cada nodo
+    apunta a su padre por índice. Los textos de historial se construyen de forma
+    incremental a partir del prefijo del padre y se guardan en una caché LRU
+    acotada, de modo que la memoria no crece con el cuadrado de la profundidad.
+    """
+    RAIZ = 0
+
+    def __init__(self, max_prefijos=256):
+        self.nodos = [NodoPensamiento(-1, 0, "", "")]
+        self.max_prefijos = max_prefijos
+        self._prefijos = OrderedDict()
+        self._lock = threading.RLock()  # el pipeline lee historiales mientras se añaden nodos
+        self.autoevaluaciones = {}  # clave del nodo -> puntuación devuelta junto al pensamiento (modo fusionado)
+        self.almacen = None  # objeto con `leer(idx)` para los textos retirados de memoria (FronteraAcotada)
+
+    def __len__(self):
+        return len(self.nodos)
+
+    def __getitem__(self, idx):
+        return self.nodos[idx]
+
+    def agregar(self, padre, nombre, pensamiento, intento=None):
+        """Añade un nodo hijo de `padre` y devuelve su índice.
+        
+        `intento` es el número de generación que produjo el pensamiento y forma
+        parte de la clave estable del nodo (por defecto, su posición entre los hermanos).
+        """
+        with self._lock:
+            if intento is None:
+                intento = len(self.nodos[padre].hijos)
+            clave = f"{self.nodos[padre].clave}.{intento}"
+            nodo = NodoPensamiento(padre, self.nodos[padre].profundidad + 1, sys.intern(nombre), sys.intern(pensamiento), clave)
+            self.nodos.append(nodo)
+            self.nodos[padre].hijos.append(len(self.nodos) - 1)
+            return len(self.nodos) - 1
+
+    def historial_texto(self, idx):
+        """Devuelve el historial del camino raíz→idx, reutilizando el prefijo del padre."""
+        if idx == self.RAIZ:
+            return ""
+        with self._lock:
+            texto = self._prefijos.get(idx)
+            if texto is not None:
+                self._prefijos.move_to_end(idx)
+                return texto
+            nodo = self.nodos[idx]
+            texto = self.historial_texto(nodo.padre) + formatear_paso(nodo.profundidad, nodo.nombre,
+                                                                       self.textos(idx)["pensamiento"])
+            self._prefijos[idx] = texto
+            if len(self._prefijos) > self.max_prefijos:
+                self._prefijos.popitem(last=False)
+            return texto
+
+    CAMPOS_TEXTO = ("pensamiento", "justificacion", "resumen")
+    
+    def textos(self, idx):
+        """Textos de un nodo, leídos del `almacen` si se retiraron de memoria."""
+        with self._lock:
+            nodo = self.nodos[idx]
+            if nodo.pensamiento is None and self.almacen is not None:
+                return self.almacen.leer(idx)
+            return {campo: getattr(nodo, campo) for campo in self.CAMPOS_TEXTO}
+    
+    def bytes_texto(self, idx=None):
+        """Tamaño aproximado (bytes UTF-8) de los textos de un nodo o, sin `idx`, de todo el árbol y su caché de prefijos."""
+        with self._lock:
+            if idx is not None:
+                nodo = self.nodos[idx]
+                return sum(len(texto.encode("utf-8")) for texto in (getattr(nodo, c) for c in self.CAMPOS_TEXTO) if texto)
+            return (sum(self.bytes_texto(i) for i in range(len(self.nodos)))
+                    + sum(len(texto.encode("utf-8")) for texto in self._prefijos.values()))
+    
+    def descargar_textos(self, idx):
+        """Retira los textos de un nodo (para guardarlos fuera de memoria) y los devuelve."""
+        with self._lock:
+            nodo = self.nodos[idx]
+            textos = {campo: getattr(nodo, campo) for campo in self.CAMPOS_TEXTO}
+            for campo in self.CAMPOS_TEXTO:
+                setattr(nodo, campo, None)
+            self._prefijos.pop(idx, None)
+            return textos
+    
+    def cargar_textos(self, idx, textos):
+        """Devuelve a un nodo los textos retirados con `descargar_textos`."""
+        with self._lock:
+            for campo, texto in textos.items():
+                setattr(self.nodos[idx], campo, texto)
+    
+    def mejores_nodos(self, n=3):
+        """Devuelve los `n` mejores nodos: primero los evaluados por puntuación y, a igualdad, los más profundos."""
+        candidatos = list(range(1, len(self.nodos)))
+        candidatos.sort(key=lambda i: (self.nodos[i].evaluacion is not None, self.nodos[i].evaluacion or 0,
+                                       self.nodos[i].profundidad), reverse=True)
+        return candidatos[:n]
+    
+    def camino(self, idx):
+        """Materializa el camino raíz→idx como lista de pasos (solo para soluciones finales)."""
+        pasos = []
+        while idx != self.RAIZ:
+            nodo = self.nodos[idx]
+            textos = self.textos(idx)
+            paso = {'nombre': nodo.nombre, 'pensamiento': textos["pensamiento"]}
+            if nodo.evaluacion is not None:
+                paso['evaluacion'] = nodo.evaluacion
+                paso['justificacion'] = textos["justificacion"]
+            if nodo.visitas:
+                paso['visitas'] = nodo.visitas
+            pasos.append(paso)
+            idx = nodo.padre
+        pasos.reverse()
+        return pasos
+
+class FronteraAcotada:
+    """Cola FIFO (nodo, profundidad) de la BFS que acota la memoria de los textos del árbol.
+    
+    Mientras los textos de los nodos en cola (pensamiento, justificación y
+    resumen) no superen `limite_bytes`, la frontera vive en un deque. A partir
+    de ahí las entradas nuevas, que son las últimas en salir, se vuelcan a una
+    base SQLite temporal junto con sus textos, que se retiran del árbol. Cuando
+    el deque se vacía, las entradas vuelven del disco en orden de llegada
+    (tantas como quepan en el límite) y sus textos se restauran en el árbol,
+    así que el orden de la búsqueda no cambia.
+    
+    Los nodos que ya salieron de la cola (expandidos o descartados) se
+    anotan con `expandido`: cuando sus textos superan también `limite_bytes`,
+    los más antiguos se archivan en la misma base y en memoria solo quedan su
+    índice y el puntero al padre. El árbol los lee del disco (`leer`) cuando
+    hace falta reconstruir un historial o una solución, así que la memoria
+    total queda acotada por unas dos veces el límite más la caché de
+    prefijos del árbol. Con `limite_bytes=None` nunca se vuelca nada.
+    """
+    def __init__(self, arbol, limite_bytes=None):
+        self.arbol = arbol
+        self.limite_bytes = limite_bytes
+        self.memoria = deque()
+        self.bytes_en_memoria = 0
+        self.max_bytes_en_memoria = 0
+        self.en_disco = 0
+        self.volcadas = 0
+        self.recargas = 0
+        self.expandidos = deque()  # (nodo, bytes) de los nodos expandidos con textos aún en memoria
+        self.bytes_expandidos = 0
+        self.archivados = 0
+        self.ruta = None
+        self._db = None
+    
+    def __len__(self):
+        return len(self.memoria) + self.en_disco
+    
+    def _abrir(self):
+        descriptor, self.ruta = tempfile.mkstemp(prefix="frontera_tot_", suffix=".sqlite")
+        os.close(descriptor)
+        self._db = sqlite3.connect(self.ruta)
+        self._db.execute("CREATE TABLE frontera (orden INTEGER PRIMARY KEY AUTOINCREMENT, nodo INTEGER, "
+                         "profundidad INTEGER, textos TEXT)")
+        self._db.execute("CREATE TABLE expandidos (nodo INTEGER PRIMARY KEY, textos TEXT)")
+        self.arbol.almacen = self
+        print(f"💾 Los textos del árbol superaron {self.limite_bytes // 1024} KB: se vuelcan a {self.ruta}")
+    
+    def _en_memoria(self, entrada, tamano):
+        self.memoria.append(entrada)
+        self.bytes_en_memoria += tamano
+        self.max_bytes_en_memoria = max(self.max_bytes_en_memoria, self.bytes_en_memoria)
+    
+    def append(self, entrada):
+        nodo, profundidad = entrada
+        tamano = self.arbol.bytes_texto(nodo)
+        # Si ya hay entradas en disco, las nuevas van detrás de ellas para conservar el orden
+        if self.en_disco == 0 and (self.limite_bytes is None or not self.memoria
+                                   or self.bytes_en_memoria + tamano <= self.limite_bytes):
+            self._en_memoria(entrada, tamano)
+            return
+        if self._db is None:
+            self._abrir()
+        textos = self.arbol.descargar_textos(nodo)
+        self._db.execute("INSERT INTO frontera (nodo, profundidad, textos) VALUES (?, ?, ?)",
+                         (nodo, profundidad, json.dumps(textos, ensure_ascii=False)))
+        self.en_disco += 1
+        self.volcadas += 1
+    
+    def _recargar(self):
+        """Trae del disco, en orden, tantas entradas como quepan en el límite (al menos una)."""
+        ultimo = None
+        filas = self._db.execute("SELECT orden, nodo, profundidad, textos FROM frontera ORDER BY orden LIMIT 256").fetchall()
+        for orden, nodo, profundidad, textos in filas:
+            textos = json.loads(textos)
+            tamano = sum(len(texto.encode("utf-8")) for texto in textos.values() if texto)
+            if self.memoria and self.bytes_en_memoria + tamano > self.limite_bytes:
+                break
+            self.arbol.cargar_textos(nodo, textos)
+            self._en_memoria((nodo, profundidad), tamano)
+            ultimo = orden
+        self._db.execute("DELETE FROM frontera WHERE orden <= ?", (ultimo,))
+        self.en_disco -= len(self.memoria)
+        self.recargas += 1
+    
+    def popleft(self):
+        if not self.memoria and self.en_disco:
+            self._recargar()
+        nodo, profundidad = self.memoria.popleft()
+        self.bytes_en_memoria -= self.arbol.bytes_texto(nodo)
+        return nodo, profundidad
+    
+    def expandido(self, nodo):
+        """Anota un nodo que ya no está en la cola; si los expandidos no caben en el límite, archiva los más antiguos."""
+        if self.limite_bytes is None or nodo == ArbolPensamientos.RAIZ:
+            return
+        tamano = self.arbol.bytes_texto(nodo)
+        self.expandidos.append((nodo, tamano))
+        self.bytes_expandidos += tamano
+        while self.bytes_expandidos > self.limite_bytes:
+            antiguo, tamano = self.expandidos.popleft()
+            if self._db is None:
+                self._abrir()
+            textos = self.arbol.descargar_textos(antiguo)
+            self._db.execute("INSERT OR REPLACE INTO expandidos (nodo, textos) VALUES (?, ?)",
+                             (antiguo, json.dumps(textos, ensure_ascii=False)))
+            self.bytes_expandidos -= tamano
+            self.archivados += 1
+    
+    def leer(self, nodo):
+        """Textos de un nodo retirado de memoria (archivado o en la parte de la cola que está en disco)."""
+        fila = None
+        if self._db is not None:
+            fila = (self._db.execute("SELECT textos FROM expandidos WHERE nodo = ?", (nodo,)).fetchone()
+                    or self._db.execute("SELECT textos FROM frontera WHERE nodo = ?", (nodo,)).fetchone())
+        if fila is None:
+            return {campo: None for campo in ArbolPensamientos.CAMPOS_TEXTO}
+        return json.loads(fila[0])
+    
+    def restaurar(self, nodos):
+        """Devuelve al árbol los textos de los `nodos` que estén en disco (p. ej. para soluciones parciales)."""
+        if self._db is None:
+            return
+        for nodo in nodos:
+            if self.arbol[nodo].pensamiento is None:
+                self.arbol.cargar_textos(nodo, self.leer(nodo))
+    
+    def cerrar(self):
+        """Cierra y borra la base temporal."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+            self.arbol.almacen = None
+            os.remove(self.ruta)
+    
+    def resumen(self):
+        texto = (f"frontera: {len(self.memoria)} en memoria ({self.bytes_en_memoria / 1024:.1f} KB, "
+                 f"máximo {self.max_bytes_en_memoria / 1024:.1f} KB")
+        if self.limite_bytes is not None:
+            texto += f" de {self.limite_bytes / 1024:.0f} KB"
+        texto += f"), {self.en_disco} en disco"
+        if self.volcadas:
+            texto += f" ({self.volcadas} volcadas y {self.recargas} recarga(s) en total)"
+        if self.archivados:
+            texto += f"; {self.archivados} nodos expandidos archivados en disco"
+        return texto
+
+# Entradas del checkpoint que acompañan a otra llamada y no cuentan como llamadas al modelo
+TIPOS_SIN_LLAMADA = ("resumen", "autoevaluacion")
+
+class RegistroBusqueda:
+    """Checkpoint append-only (JSONL) de una búsqueda ToT.
+    
+    Cada llamada al modelo que termina bien (descomposición, pensamiento o
+    evaluación) se escribe como una línea con una clave determinista: la del
+    nodo es el camino de intentos desde la raíz ("r.0.2"). Al reanudar, las
+    búsquedas consultan el registro antes de llamar al modelo, de modo que el
+    árbol y la frontera se reconstruyen sin repetir las llamadas ya pagadas.
+    
+    La cabecera guarda también la `configuracion` de la búsqueda (modelo,
+    servidor, modo de evaluación, factor de ramificación...): un checkpoint
+    hecho con otra configuración no se reanuda, porque sus evaluaciones
+    tendrían otro formato o corresponderían a otros candidatos.
+    """
+    def __init__(self, ruta, problema, estrategia, reanudar=False, configuracion=None):
+        self.ruta = ruta
+        self.entradas = {}
+        self.reutilizadas = 0
+        self._lock = threading.Lock()
+        # Ida y vuelta por JSON para comparar con lo leído del archivo (las tuplas pasan a listas)
+        configuracion = json.loads(json.dumps(configuracion or {}, ensure_ascii=False))
+        cabecera = {"tipo": "cabecera", "problema": problema, "estrategia": estrategia, "configuracion": configuracion}
+        
+        if reanudar and os.path.exists(ruta):
+            with open(ruta, "r", encoding="utf-8") as f:
+                contenido = f.read()
+            lineas = contenido.splitlines()
+            if contenido and not contenido.endswith("\n"):
+                # Se cerró a mitad de una línea: la terminamos para no pegarle la siguiente
+                with open(ruta, "a", encoding="utf-8") as f:
+                    f.write("\n")
+            registros = []
+            for linea in lineas:
+                try:
+                    registros.append(json.loads(linea))
+                except json.JSONDecodeError:
+                    # Última línea cortada por una interrupción: se ignora
+                    continue
+            guardada = registros[0].get("configuracion", {}) if registros else {}
+            distintos = sorted(campo for campo in set(guardada) | set(configuracion)
+                               if guardada.get(campo) != configuracion.get(campo))
+            if not registros or registros[0].get("problema") != problema or registros[0].get("estrategia") != estrategia:
+                print(f"⚠️ El checkpoint {ruta} corresponde a otro problema o estrategia; se empieza de cero")
+                reanudar = False
+            elif distintos:
+                print(f"⚠️ El checkpoint {ruta} se hizo con otra configuración ({', '.join(distintos)}); se empieza de cero")
+                reanudar = False
+            else:
+                for registro in registros[1:]:
+                    self.entradas[(registro["tipo"], registro["clave"])] = registro["valor"]
+                completadas = sum(1 for tipo, _ in self.entradas if tipo not in TIPOS_SIN_LLAMADA)
+                print(f"♻️ Checkpoint cargado desde {ruta}: {completadas} llamadas completadas")
+        else:
+            reanudar = False
+        
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self.archivo = open(ruta, "a" if reanudar else "w", encoding="utf-8")
+        if not reanudar:
+            self._escribir(cabecera)
+    
+    def _escribir(self, registro):
+        self.archivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        self.archivo.flush()
+    
+    def obtener(self, tipo, clave):
+        """Devuelve el valor guardado para (tipo, clave) o None.
+        
+        Los TIPOS_SIN_LLAMADA (el resumen de una evaluación, la autoevaluación
+        de un pensamiento) no cuentan como llamadas reutilizadas.
+        """
+        with self._lock:
+            valor = self.entradas.get((tipo, clave))
+            if valor is not None and tipo not in TIPOS_SIN_LLAMADA:
+                self.reutilizadas += 1
+            return valor
+    
+    def guardar(self, tipo, clave, valor):
+        """Añade el resultado de una llamada completada al registro."""
+        with self._lock:
+            self.entradas[(tipo, clave)] = valor
+            self._escribir({"tipo": tipo, "clave": clave, "valor": valor})
+    
+    def cerrar(self):
+        self.archivo.close()
+        if self.reutilizadas:
+            print(f"♻️ Llamadas reutilizadas del checkpoint: {self.reutilizadas}")
+
+class CacheDescomposiciones:
+    """Caché persistente (JSON) de descomposiciones en pasos.
+    
+    La descomposición se pide a temperatura baja y es prácticamente estable,
+    así que se guarda por modelo y texto normalizado del problema. Las
+    ejecuciones siguientes se ahorran esa primera llamada, de la que depende
+    todo lo demás.
+    """
+    def __init__(self, ruta=os.path.join("resultados_tot", "cache_pasos.json")):
+        self.ruta = ruta
+        self.entradas = {}
+        self.aciertos = 0
+        self._lock = threading.Lock()
+        
+        if os.path.exists(ruta):
+            try:
+                with open(ruta, "r", encoding="utf-8") as f:
+                    self.entradas = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"⚠️ No se pudo leer la caché de pasos {ruta} ({e}); se empieza vacía")
+    
+    @staticmethod
+    def clave(problema, modelo):
+        """Clave estable: modelo + problema sin diferencias de mayúsculas, espacios ni forma Unicode."""
+        normalizado = " ".join(unicodedata.normalize("NFC", problema).lower().split())
+        return hashlib.sha1(f"{modelo}\n{normalizado}".encode("utf-8")).hexdigest()
+    
+    def obtener(self, problema, modelo):
+        """Devuelve los pasos guardados para (problema, modelo) o None."""
+        with self._lock:
+            entrada = self.entradas.get(self.clave(problema, modelo))
+            if entrada is None:
+                return None
+            self.aciertos += 1
+            return entrada["pasos"]
+    
+    def guardar(self, problema, modelo, pasos):
+        """Guarda la descomposición y reescribe el archivo de forma atómica."""
+        with self._lock:
+            self.entradas[self.clave(problema, modelo)] = {"modelo": modelo, "problema": problema, "pasos": pasos}
+            directorio = os.path.dirname(self.ruta)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            temporal = self.ruta + ".tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(self.entradas, f, ensure_ascii=False, indent=2)
+            os.replace(temporal, self.ruta)
+
+def dividir_en_pasos_estructurado(contexto, problema):
+    """Pide la descomposición como JSON validado contra ESQUEMA_PASOS. Devuelve None si falla."""
+    prompt = construir_prompt(problema, """Necesito dividir el problema en 3-4 pasos clave para resolverlo.
 
-{problema}
+Responde solo con un objeto JSON con la lista "pasos". Cada paso tiene "nombre" (corto),
+"descripcion" (una frase) y "determinar" (qué información se necesita encontrar en ese paso).
+""")
+    
+    datos, error = contexto.llamar_estructurada(prompt, ESQUEMA_PASOS, "pasos", temperatura=0.3)
+    
+    if error:
+        print(f"Error en la descomposición estructurada: {error}")
+        return None
+    
+    return [{"nombre": paso["nombre"].strip(), "descripcion": paso["descripcion"].strip(), "determinar": paso["determinar"].strip()}
+            for paso in datos["pasos"]]
+
+# Pasos genéricos que se usan cuando el modelo no devuelve una descomposición válida
+PASOS_POR_DEFECTO = [
+    {"nombre": "Entender el problema", "descripcion": "Analizar el problema para comprenderlo completamente"},
+    {"nombre": "Planear enfoque", "descripcion": "Decidir qué método usar para resolver el problema"},
+    {"nombre": "Ejecutar solución", "descripcion": "Aplicar el método elegido paso a paso"}
+]
+
+def dividir_en_pasos(contexto, problema):
+    """Divide un problema en pasos específicos usando el modelo.
+    
+    Con `contexto.salida_estructurada` la descomposición se pide como JSON con
+    esquema; si esa llamada falla se recurre al formato de texto.
+    """
+    if contexto.salida_estructurada:
+        pasos = dividir_en_pasos_estructurado(contexto, problema)
+        if pasos:
+            return pasos
+    
+    prompt = construir_prompt(problema, """Necesito dividir el problema en 3-4 pasos clave para resolverlo.
 
 Por favor, identifica los pasos principales para resolver este problema. 
 Para cada paso, proporciona:
@@ -76,18 +986,14 @@ Determinar: [Qué se necesita encontrar]
 
 PASO 2: [Nombre del paso]
 ...y así sucesivamente.
-"""
+""")
     
-    respuesta, error = llamar_lmstudio_api(prompt, modelo_seleccionado, temperatura=0.3)
+    respuesta, error = contexto.llamar(prompt, temperatura=0.3)
     
     if error:
         print(f"Error al dividir en pasos: {error}")
         # Pasos genéricos por defecto si falla
-        return [
-            {"nombre": "Entender el problema", "descripcion": "Analizar el problema para comprenderlo completamente"},
-            {"nombre": "Planear enfoque", "descripcion": "Decidir qué método usar para resolver el problema"},
-            {"nombre": "Ejecutar solución", "descripcion": "Aplicar el método elegido paso a paso"}
-        ]
+        return [dict(paso) for paso in PASOS_POR_DEFECTO]
     
     # Extraer los pasos de la respuesta
     pasos = []
@@ -119,71 +1025,112 @@ PASO 2: [Nombre del paso]
     
     # Asegurarse de que haya al menos algunos pasos
     if not pasos:
-        pasos = [
-            {"nombre": "Entender el problema", "descripcion": "Analizar el problema para comprenderlo completamente"},
-            {"nombre": "Planear enfoque", "descripcion": "Decidir qué método usar para resolver el problema"},
-            {"nombre": "Ejecutar solución", "descripcion": "Aplicar el método elegido paso a paso"}
-        ]
+        pasos = [dict(paso) for paso in PASOS_POR_DEFECTO]
         
     return pasos
 
-def generar_pensamiento(problema, paso_actual, historia_pasos=None, temperatura=0.8):
-    """Genera varios pensamientos posibles para un paso dado."""
-    if historia_pasos is None:
-        historia_pasos = []
-    
-    # Construir el contexto basado en la historia de pasos
-    contexto = ""
-    if historia_pasos:
-        contexto = "Pasos previos:\n"
-        for i, hist in enumerate(historia_pasos):
-            contexto += f"PASO {i+1}: {hist['nombre']}\n"
-            contexto += f"Pensamiento: {hist['pensamiento']}\n\n"
-    
-    prompt = f"""Estás resolviendo este problema: "{problema}"
+ERROR_PENSAMIENTO = "No se pudo generar un pensamiento debido a un error."
 
-{contexto}
-Ahora estás en el paso: {paso_actual['nombre']}
+def construir_prompt_pensamiento(problema, paso_actual, historial_texto):
+    """Construye el prompt que pide un pensamiento para `paso_actual`."""
+    return construir_prompt(problema, f"""Ahora estás en el paso: {paso_actual['nombre']}
 Descripción del paso: {paso_actual['descripcion']}
 
 Genera un pensamiento detallado para este paso. Considera diferentes enfoques y razona paso a paso.
 Tu pensamiento debe ser coherente con los pasos anteriores (si existen) y debe avanzar hacia la solución del problema.
 
 Tu pensamiento para este paso:
-"""
+""", historial_texto)
+
+def generar_pensamiento(contexto, problema, paso_actual, historia_pasos=None, temperatura=0.8, historial_texto=None):
+    """Genera varios pensamientos posibles para un paso dado.
+    
+    Si se proporciona `historial_texto` (prefijo ya construido por el árbol),
+    se usa directamente en lugar de recorrer `historia_pasos`.
+    """
+    if historial_texto is None:
+        historial_texto = formatear_historial(historia_pasos or [])
+    
+    prompt = construir_prompt_pensamiento(problema, paso_actual, historial_texto)
 
-    respuesta, error = llamar_lmstudio_api(prompt, modelo_seleccionado, temperatura=temperatura)
+    respuesta, error = contexto.llamar(prompt, temperatura=temperatura)
     
     if error:
         print(f"Error al generar pensamiento: {error}")
-        return "No se pudo generar un pensamiento debido a un error."
+        return ERROR_PENSAMIENTO
     
     return respuesta.strip()
 
-def evaluar_pensamiento(problema, pasos, historia_actual, evaluacion_previa=None):
-    """Evalúa la calidad de un camino de pensamiento."""
+def generar_pensamiento_puntuado(contexto, problema, paso_actual, historial_texto, temperatura=0.8):
+    """Genera un pensamiento y su autoevaluación en una sola llamada estructurada.
+    
+    Devuelve (pensamiento, puntuacion). Si la salida estructurada falla se
+    genera el pensamiento de la forma habitual y la puntuación es None, para
+    que lo evalúe el evaluador separado.
+    """
+    prompt = construir_prompt_pensamiento(problema, paso_actual, historial_texto).replace(
+        "Tu pensamiento para este paso:\n",
+        'Responde solo con un objeto JSON con "pensamiento" (tu pensamiento para este paso) y "puntuacion" '
+        '(entero del 1 al 10 que valora qué tan correcto y prometedor es el camino incluyendo este pensamiento).\n')
+    
+    datos, error = contexto.llamar_estructurada(prompt, ESQUEMA_PENSAMIENTO_PUNTUADO, "pensamiento_puntuado",
+                                                temperatura=temperatura)
+    if not error:
+        return datos["pensamiento"].strip(), datos["puntuacion"]
+    
+    print(f"Error en la generación puntuada ({error}), generando sin autoevaluación")
+    return generar_pensamiento(contexto, problema, paso_actual, temperatura=temperatura, historial_texto=historial_texto), None
+
+def puntuacion_por_logprobs(top_logprobs):
+    """Calcula la puntuación esperada (1-10) a partir de la masa de probabilidad sobre los dígitos.
+    
+    El modelo responde con un dígito del 0 al 9 (un único token en cualquier
+    tokenizador), que se traslada a la escala 1-10. Devuelve None si ninguna
+    alternativa es un dígito.
+    """
+    masa = defaultdict(float)
+    for token, logprob in top_logprobs.items():
+        token = token.strip()
+        if len(token) == 1 and token.isdigit():
+            masa[int(token)] += math.exp(logprob)
+    
+    total = sum(masa.values())
+    if total == 0:
+        return None
+    
+    esperado = sum(digito * probabilidad for digito, probabilidad in masa.items()) / total
+    return round(1 + esperado, 2)
+
+def evaluar_pensamiento(contexto, problema, pasos, historia_actual, evaluacion_previa=None, historial_texto=None,
+                        profundidad=None, modo="texto", justificar=None):
+    """Evalúa la calidad de un camino de pensamiento.
+    
+    `historial_texto` y `profundidad` permiten evaluar un nodo del árbol sin
+    materializar la lista de pasos del camino.
+    
+    Con `modo="logprobs"` se pide un único token y la puntuación es el valor
+    esperado sobre las probabilidades de cada dígito (una sola prefill). La
+    justificación es opcional: por defecto solo se genera para soluciones
+    completas. Si el servidor no devuelve logprobs se usa el modo de texto.
+    
+    Con `modo="estructurado"` la respuesta se pide como JSON validado contra
+    ESQUEMA_EVALUACION, sin texto adicional que interpretar.
+    """
     # Construir el historial completo
-    historial = ""
-    for i, paso in enumerate(historia_actual):
-        historial += f"PASO {i+1}: {paso['nombre']}\n"
-        historial += f"Pensamiento: {paso['pensamiento']}\n\n"
+    historial = historial_texto if historial_texto is not None else formatear_historial(historia_actual)
+    if profundidad is None:
+        profundidad = len(historia_actual)
     
     # Contexto de evaluación previa si existe
     contexto_evaluacion = ""
     if evaluacion_previa is not None:
-        contexto_evaluacion = f"\nLa evaluación previa fue: {evaluacion_previa}/10."
+        contexto_evaluacion = f" La evaluación previa fue: {evaluacion_previa}/10."
     
     # Determinar si es la evaluación final
-    es_final = len(historia_actual) == len(pasos)
+    es_final = profundidad == len(pasos)
     tipo_evaluacion = "final" if es_final else "intermedios"
     
-    prompt = f"""Estás evaluando un camino de pensamiento para resolver este problema: 
-"{problema}"
-
-A continuación se muestra el historial de pensamientos:
-{historial}
-
-{contexto_evaluacion}
+    prompt = construir_prompt(problema, f"""Estás evaluando el camino de pensamiento anterior.{contexto_evaluacion}
 
 Evalúa la calidad y efectividad de estos pensamientos {tipo_evaluacion} en una escala del 1 al 10,
 donde 10 es excelente (razonamiento perfecto que lleva a la solución correcta)
@@ -196,12 +1143,39 @@ Considera:
 - Coherencia entre pasos
 
 Proporciona primero una puntuación numérica y luego una breve justificación.
-"""
+""", historial)
 
-    respuesta, error = llamar_lmstudio_api(prompt, modelo_seleccionado, temperatura=0.3)
+    if modo == "estructurado":
+        prompt_estructurado = prompt.replace(
+            "Proporciona primero una puntuación numérica y luego una breve justificación.\n",
+            'Responde solo con un objeto JSON con "puntuacion" (entero del 1 al 10) y "justificacion" (una o dos frases).\n')
+        datos, error = contexto.llamar_estructurada(prompt_estructurado, ESQUEMA_EVALUACION, "evaluacion")
+        if not error:
+            return datos["puntuacion"], datos["justificacion"].strip()
+        print(f"Error en la evaluación estructurada ({error}), usando evaluación de texto")
+    
+    puntuacion_logprobs = None
+    if modo == "logprobs":
+        prompt_logprobs = prompt.replace(
+            "Proporciona primero una puntuación numérica y luego una breve justificación.\n",
+            "Responde únicamente con un dígito del 0 (muy pobre) al 9 (excelente).\n\nPuntuación:")
+        top_logprobs, error = contexto.llamar_logprobs(prompt_logprobs)
+        puntuacion_logprobs = None if error else puntuacion_por_logprobs(top_logprobs)
+        
+        if puntuacion_logprobs is None:
+            print(f"No se obtuvieron logprobs ({error or 'sin dígitos en las alternativas'}), usando evaluación de texto")
+        else:
+            if justificar is None:
+                justificar = es_final
+            if not justificar:
+                return puntuacion_logprobs, f"Puntuación esperada a partir de logprobs: {puntuacion_logprobs}/10."
+    
+    respuesta, error = contexto.llamar(prompt, temperatura=contexto.temperatura_evaluacion)
     
     if error:
         print(f"Error al evaluar pensamiento: {error}")
+        if puntuacion_logprobs is not None:
+            return puntuacion_logprobs, "No se pudo generar la justificación debido a un error."
         # Valor por defecto conservador
         return 5, "No se pudo evaluar debido a un error."
     
@@ -221,15 +1195,327 @@ Proporciona primero una puntuación numérica y luego una breve justificación.
     # Limpiar respuesta para justificación
     justificacion = re.sub(r"^\d+(?:\/10)?[:\.\s]*", "", respuesta, 1).strip()
     
+    # En modo logprobs la puntuación continua prevalece; el texto solo aporta la justificación
+    if puntuacion_logprobs is not None:
+        puntuacion = puntuacion_logprobs
+    
     return puntuacion, justificacion
 
-def ejecutar_tot_bfs(problema, amplitud=3, max_profundidad=None, factor_ramificacion=2):
-    """Ejecuta Tree of Thoughts utilizando BFS (Breadth-First Search)."""
+# Longitud máxima del resumen acumulado que usa la evaluación incremental
+MAX_CARACTERES_RESUMEN = 600
+
+def evaluar_paso_incremental(contexto, problema, pasos, resumen_previo, evaluacion_previa, nombre, pensamiento, profundidad):
+    """Evalúa solo el paso nuevo a partir de un resumen compacto del camino previo.
+    
+    En lugar de reenviar todo el historial, el prompt lleva el resumen del
+    prefijo (acotado a MAX_CARACTERES_RESUMEN) y el pensamiento nuevo, así que
+    su tamaño no crece con la profundidad. La misma llamada devuelve el
+    resumen actualizado que usarán los hijos. Devuelve (puntuacion,
+    justificacion, resumen).
+    """
+    contexto_evaluacion = f" (evaluados con {evaluacion_previa}/10)" if evaluacion_previa is not None else ""
+    prompt = construir_prompt(problema, f"""Nuevo paso ({profundidad} de {len(pasos)}) - {nombre}:
+{pensamiento}
+
+Evalúa SOLO el nuevo paso, en el contexto del resumen, en una escala del 1 al 10,
+donde 10 es excelente (correcto y avanza hacia la solución) y 1 es muy pobre (erróneo o incoherente).
+
+Responde exactamente con este formato:
+PUNTUACIÓN: <número del 1 al 10>
+JUSTIFICACIÓN: <una frase>
+RESUMEN: <resumen del camino incluyendo el nuevo paso, con los datos y resultados clave, en 3 frases como máximo>
+""", resumen_previo, f"Resumen de los pasos anteriores{contexto_evaluacion}")
+
+    respuesta, error = contexto.llamar(prompt, temperatura=contexto.temperatura_evaluacion)
+    
+    # Si el modelo no da un resumen, se acumula el paso recortado al máximo permitido
+    resumen = f"{resumen_previo} {nombre}: {pensamiento}".strip()[-MAX_CARACTERES_RESUMEN:]
+    
+    if error:
+        print(f"Error al evaluar el paso: {error}")
+        return 5, "No se pudo evaluar debido a un error.", resumen
+    
+    match = re.search(r"PUNTUACI[OÓ]N:\s*(\d+)", respuesta, re.IGNORECASE) or re.search(r"(\d+)(?:\/10|\s*de\s*10)?", respuesta)
+    puntuacion = max(1, min(10, int(match.group(1)))) if match else 5
+    
+    match = re.search(r"JUSTIFICACI[OÓ]N:\s*(.*?)(?:\n\s*RESUMEN:|$)", respuesta, re.IGNORECASE | re.DOTALL)
+    justificacion = match.group(1).strip() if match else re.sub(r"^\d+(?:\/10)?[:\.\s]*", "", respuesta.strip(), 1)
+    
+    match = re.search(r"RESUMEN:\s*(.*)", respuesta, re.IGNORECASE | re.DOTALL)
+    if match and match.group(1).strip():
+        resumen = match.group(1).strip()[:MAX_CARACTERES_RESUMEN]
+    
+    return puntuacion, justificacion, resumen
+
+# Coeficientes fijos de las permutaciones de MinHash (reproducibles entre ejecuciones)
+_PRIMO_MINHASH = (1 << 61) - 1
+_GENERADOR_MINHASH = random.Random(0)  # un solo generador: a y c salen de la misma secuencia, uno tras otro
+_PERMUTACIONES_MINHASH = [(_GENERADOR_MINHASH.randrange(1, _PRIMO_MINHASH), _GENERADOR_MINHASH.randrange(0, _PRIMO_MINHASH))
+                          for _ in range(64)]
+
+def firma_minhash(texto, tamano_shingle=3):
+    """Calcula la firma MinHash de un texto a partir de sus shingles de palabras."""
+    palabras = re.findall(r"\w+", texto.lower())
+    if len(palabras) < tamano_shingle:
+        shingles = {" ".join(palabras)}
+    else:
+        shingles = {" ".join(palabras[i:i + tamano_shingle]) for i in range(len(palabras) - tamano_shingle + 1)}
+    
+    hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles]
+    return [min((a * h + c) % _PRIMO_MINHASH for h in hashes) for a, c in _PERMUTACIONES_MINHASH]
+
+def similitud_minhash(firma_a, firma_b):
+    """Estima la similitud de Jaccard entre dos textos a partir de sus firmas."""
+    return sum(1 for x, y in zip(firma_a, firma_b) if x == y) / len(firma_a)
+
+def deduplicar_pensamientos(pensamientos, umbral=0.85):
+    """Fusiona pensamientos hermanos casi idénticos antes de evaluarlos.
+    
+    Devuelve una lista de (pensamiento, fusionados), conservando el primero de
+    cada grupo y contando cuántos duplicados se fusionaron en él.
+    """
+    representantes = []  # [pensamiento, firma, fusionados]
+    for pensamiento in pensamientos:
+        firma = firma_minhash(pensamiento)
+        for representante in representantes:
+            if similitud_minhash(firma, representante[1]) >= umbral:
+                representante[2] += 1
+                break
+        else:
+            representantes.append([pensamiento, firma, 0])
+    
+    return [(pensamiento, fusionados) for pensamiento, _, fusionados in representantes]
+
+def generar_pensamiento_registrado(contexto, problema, paso_actual, historial_texto, temperatura, clave,
+                                   autoevaluaciones=None):
+    """Genera un pensamiento consultando antes el checkpoint.
+    
+    Con un diccionario `autoevaluaciones` (modo fusionado) el pensamiento se
+    pide junto con su puntuación en una sola llamada y la puntuación se guarda
+    en él bajo `clave`. Devuelve None si no está en el registro del contexto y
+    ya no queda presupuesto.
+    """
+    registro = contexto.registro
+    guardado = registro.obtener("pensamiento", clave) if registro is not None else None
+    if guardado is not None:
+        if autoevaluaciones is not None:
+            autoevaluacion = registro.obtener("autoevaluacion", clave)
+            if autoevaluacion is not None:
+                autoevaluaciones[clave] = autoevaluacion
+        return guardado
+    if contexto.agotado():
+        return None
+    
+    if autoevaluaciones is None:
+        pensamiento = generar_pensamiento(contexto, problema, paso_actual, temperatura=temperatura,
+                                          historial_texto=historial_texto)
+    else:
+        pensamiento, autoevaluacion = generar_pensamiento_puntuado(contexto, problema, paso_actual, historial_texto,
+                                                                   temperatura)
+        if autoevaluacion is not None:
+            autoevaluaciones[clave] = autoevaluacion
+            if registro is not None:
+                registro.guardar("autoevaluacion", clave, autoevaluacion)
+    if registro is not None and pensamiento != ERROR_PENSAMIENTO:
+        registro.guardar("pensamiento", clave, pensamiento)
+    return pensamiento
+
+def fusionar_hermanos(pensamientos, umbral_duplicados=0.85):
+    """Convierte los pensamientos de cada intento (None si no se generó) en hijos listos para evaluar.
+    
+    Devuelve una lista de (pensamiento, fusionados, intento). Con
+    `umbral_duplicados=None` no se deduplica.
+    """
+    validos = [(i, pensamiento) for i, pensamiento in enumerate(pensamientos) if pensamiento is not None]
+    if umbral_duplicados is None:
+        return [(pensamiento, 0, i) for i, pensamiento in validos]
+    
+    # Conservamos el intento original de cada representante para que su clave sea estable
+    intentos = {}
+    for i, pensamiento in validos:
+        intentos.setdefault(pensamiento, i)
+    hijos = [(pensamiento, fusionados, intentos[pensamiento])
+             for pensamiento, fusionados in deduplicar_pensamientos([p for _, p in validos], umbral_duplicados)]
+    if len(hijos) < len(validos):
+        print(f"🔁 {len(validos) - len(hijos)} pensamiento(s) casi duplicado(s) fusionado(s) antes de evaluar")
+    return hijos
+
+def generar_hijos(contexto, problema, paso_actual, historial_actual, profundidad, factor_ramificacion, temperatura_base,
+                  incremento_temperatura, clave_padre="r", autoevaluaciones=None):
+    """Genera los pensamientos hermanos de un nodo y fusiona los casi duplicados.
+    
+    Devuelve una lista de (pensamiento, fusionados, intento) lista para evaluar.
+    Con `contexto.umbral_duplicados=None` no se deduplica. Los pensamientos ya
+    presentes en el registro (clave `clave_padre.intento`) no se vuelven a generar.
+    `autoevaluaciones` activa la generación puntuada del modo fusionado.
+    """
+    pensamientos = [None] * factor_ramificacion
+    for i in range(factor_ramificacion):
+        try:
+            print(f"\nGenerando pensamiento {i+1}/{factor_ramificacion} para PASO {profundidad+1}: {paso_actual['nombre']}...")
+            pensamientos[i] = generar_pensamiento_registrado(contexto, problema, paso_actual, historial_actual,
+                                                             temperatura_base + (i * incremento_temperatura),
+                                                             f"{clave_padre}.{i}", autoevaluaciones)
+        except Exception as e:
+            print(f"⚠️ Error durante la generación del pensamiento {i+1}: {e}")
+            continue
+        if pensamientos[i] is None:
+            break  # sin presupuesto para más intentos
+    
+    return fusionar_hermanos(pensamientos, contexto.umbral_duplicados)
+
+def obtener_pasos(contexto, problema):
+    """Divide el problema en pasos reutilizando una descomposición ya hecha.
+    
+    Se consulta primero el checkpoint (`contexto.registro`) y después la caché
+    persistente (`contexto.cache_pasos`, CacheDescomposiciones); solo si
+    ninguno la tiene se llama al modelo. Los pasos genéricos de respaldo no se
+    cachean. La caché distingue la descomposición de cada modelo.
+    """
+    registro, cache_pasos = contexto.registro, contexto.cache_pasos
+    if registro is not None:
+        pasos = registro.obtener("pasos", "problema")
+        if pasos is not None:
+            return pasos
+    
+    pasos = cache_pasos.obtener(problema, contexto.modelo) if cache_pasos is not None else None
+    if pasos is not None:
+        print("♻️ Descomposición en pasos tomada de la caché")
+    else:
+        pasos = dividir_en_pasos(contexto, problema)
+        if cache_pasos is not None and pasos != PASOS_POR_DEFECTO:
+            cache_pasos.guardar(problema, contexto.modelo, pasos)
+    if registro is not None:
+        registro.guardar("pasos", "problema", pasos)
+    return pasos
+
+def evaluar_nodo(contexto, problema, pasos, arbol, idx, evaluacion_previa=None, final=False, verificar=False):
+    """Evalúa el camino raíz→idx del árbol, reutilizando la evaluación del checkpoint si ya se hizo.
+    
+    El modo de evaluación es `contexto.modo_evaluacion`. `final` distingue la evaluación de una solución completa de la del nodo
+    al crearse, para que cada una tenga su propia entrada en el registro.
+    
+    En modo "fusionado" el nodo usa la autoevaluación que llegó junto con el
+    pensamiento; el evaluador separado (modo texto) solo se llama para las
+    soluciones completas, para desempatar (`verificar=True`) o cuando no hay
+    autoevaluación.
+    
+    En modo "incremental" solo se evalúa el paso nuevo sobre el resumen
+    acumulado del padre (`evaluar_paso_incremental`) y el nodo guarda su propio
+    resumen para sus hijos. Las soluciones completas se evalúan con el
+    historial entero (modo texto).
+    """
+    modo, registro = contexto.modo_evaluacion, contexto.registro
+    if modo == "fusionado":
+        autoevaluacion = arbol.autoevaluaciones.get(arbol[idx].clave)
+        if autoevaluacion is not None and not final and not verificar:
+            return autoevaluacion, "Autoevaluación del generador (sin llamada al evaluador)."
+        modo = "texto"
+    incremental = modo == "incremental" and not final
+    if modo == "incremental" and not incremental:
+        modo = "texto"
+    
+    clave = arbol[idx].clave + ("#final" if final else "#verificada" if verificar else "")
+    if registro is not None:
+        guardada = registro.obtener("evaluacion", clave)
+        if guardada is not None:
+            if incremental:
+                arbol[idx].resumen = registro.obtener("resumen", clave)
+            return guardada[0], guardada[1]
+    
+    if incremental:
+        nodo = arbol[idx]
+        padre = arbol[nodo.padre]
+        # Sin resumen del padre (p. ej. su evaluación falló) se usa el final de su historial
+        resumen_previo = padre.resumen if padre.resumen is not None else arbol.historial_texto(nodo.padre)[-MAX_CARACTERES_RESUMEN:]
+        if evaluacion_previa is None:
+            evaluacion_previa = padre.evaluacion
+        puntuacion, justificacion, nodo.resumen = evaluar_paso_incremental(contexto, problema, pasos, resumen_previo,
+                                                                           evaluacion_previa, nodo.nombre, nodo.pensamiento,
+                                                                           nodo.profundidad)
+        if registro is not None and not justificacion.startswith("No se pudo"):
+            registro.guardar("resumen", clave, nodo.resumen)
+    else:
+        puntuacion, justificacion = evaluar_pensamiento(contexto, problema, pasos, None, evaluacion_previa,
+                                                        historial_texto=arbol.historial_texto(idx),
+                                                        profundidad=arbol[idx].profundidad, modo=modo)
+    if registro is not None and not justificacion.startswith("No se pudo"):
+        registro.guardar("evaluacion", clave, [puntuacion, justificacion])
+    return puntuacion, justificacion
+
+def ordenar_candidatos(contexto, problema, pasos, arbol, candidatos, k):
+    """Ordena los candidatos (puntuacion, nodo) de mayor a menor puntuación.
+    
+    En modo fusionado las autoevaluaciones enteras empatan a menudo: si el
+    empate cae justo en el corte de los `k` mejores, los candidatos empatados
+    se reevalúan con el evaluador separado y esa puntuación decide el orden
+    dentro del empate.
+    """
+    candidatos = sorted(candidatos, key=lambda x: x[0], reverse=True)
+    if contexto.modo_evaluacion != "fusionado" or len(candidatos) <= k or candidatos[k - 1][0] != candidatos[k][0]:
+        return candidatos
+    
+    corte = candidatos[k][0]
+    desempate = {}
+    for puntuacion, nodo in candidatos:
+        if puntuacion == corte and not contexto.agotado():
+            desempate[nodo], _ = evaluar_nodo(contexto, problema, pasos, arbol, nodo, verificar=True)
+    print(f"⚖️ Empate a {corte}/10 en el corte del beam: {len(desempate)} candidato(s) reevaluado(s) con el evaluador")
+    return sorted(candidatos, key=lambda x: (x[0], desempate.get(x[1], 0)), reverse=True)
+
+def soluciones_parciales(arbol, motivo, n=3):
+    """Construye soluciones con los mejores caminos parciales cuando la búsqueda se detiene antes de tiempo."""
+    soluciones = []
+    for idx in arbol.mejores_nodos(n):
+        nodo = arbol[idx]
+        justificacion = f"Solución parcial (búsqueda detenida por {motivo}). {nodo.justificacion or 'Sin evaluar.'}"
+        soluciones.append((nodo.evaluacion or 0, arbol.camino(idx), justificacion))
+    return soluciones
+
+def informar_parada(criterio):
+    """Muestra si la búsqueda terminó o se podó antes de tiempo por un `CriterioParada`."""
+    if criterio is None:
+        return
+    if criterio.motivo:
+        print(f"\n⏩ Parada anticipada: {criterio.motivo}. No se exploró el resto del árbol.")
+    if criterio.podados:
+        print(f"✂️ Subárboles cancelados por dominancia: {criterio.podados}")
+
+def informar_presupuesto(presupuesto):
+    """Muestra el uso del presupuesto al terminar una búsqueda."""
+    if presupuesto is None:
+        return
+    if presupuesto.motivo:
+        print(f"\n⏹️ Búsqueda detenida: se alcanzó el {presupuesto.motivo}. Se devuelve la mejor solución encontrada hasta ahora.")
+    print(f"📊 Uso del presupuesto: {presupuesto.resumen()}")
+
+def ejecutar_tot_bfs(problema, amplitud=3, max_profundidad=None, factor_ramificacion=2, contexto=None,
+                     limite_memoria_kb=None):
+    """Ejecuta Tree of Thoughts utilizando BFS (Breadth-First Search).
+    
+    La configuración llega en `contexto` (ContextoBusqueda). Con un
+    `presupuesto`, la búsqueda se detiene al alcanzar cualquiera de sus
+    límites y devuelve lo mejor encontrado hasta ese momento. `modo_evaluacion`
+    se usa en `evaluar_nodo` ("texto", "logprobs", "estructurado", "fusionado" o "incremental") y
+    `salida_estructurada` pide la descomposición en pasos como JSON.
+    Los pensamientos hermanos con similitud MinHash >= `umbral_duplicados` se
+    fusionan antes de evaluarlos (None para desactivarlo). Con un `registro`
+    (RegistroBusqueda) cada llamada completada se guarda en el checkpoint y las
+    ya guardadas no se repiten. Un `criterio` (CriterioParada) termina la
+    búsqueda al alcanzar una puntuación objetivo y poda los hermanos dominados.
+    Con `limite_memoria_kb`, la cola de nodos pendientes (FronteraAcotada)
+    vuelca a disco los que no caben en ese límite de memoria y archiva los
+    textos de los nodos ya expandidos cuando superan el mismo límite.
+    """
     print(f"\n=== EJECUTANDO TREE OF THOUGHTS (BFS) ===")
     print(f"Problema: {problema}")
     
+    if contexto is None:
+        contexto = ContextoBusqueda()
+    presupuesto, criterio = contexto.presupuesto, contexto.criterio
+    
     # Dividir el problema en pasos
-    pasos = dividir_en_pasos(problema)
+    pasos = obtener_pasos(contexto, problema)
     print(f"\nProblema dividido en {len(pasos)} pasos:")
     for i, paso in enumerate(pasos):
         print(f"PASO {i+1}: {paso['nombre']} - {paso['descripcion']}")
@@ -237,17 +1523,25 @@ def ejecutar_tot_bfs(problema, amplitud=3, max_profundidad=None, factor_ramifica
     if max_profundidad is None:
         max_profundidad = len(pasos)
     
-    # Estructura para BFS
-    cola = deque([([], 0)])  # (historia_pasos, profundidad)
+    # Estructura para BFS: la cola solo guarda índices de nodos del árbol y vuelca a disco lo que no cabe
+    arbol = ArbolPensamientos()
+    cola = FronteraAcotada(arbol, limite_memoria_kb * 1024 if limite_memoria_kb else None)
+    cola.append((ArbolPensamientos.RAIZ, 0))  # (nodo, profundidad)
     mejores_soluciones = []
     
     while cola and len(mejores_soluciones) < amplitud:
-        historia_actual, profundidad = cola.popleft()
+        if presupuesto is not None and presupuesto.agotado():
+            break
+        if criterio is not None and criterio.detenido():
+            break
+        
+        nodo_actual, profundidad = cola.popleft()
+        historial_actual = arbol.historial_texto(nodo_actual)
         
         # Si hemos llegado a la profundidad máxima, evaluamos la solución completa
         if profundidad >= max_profundidad or profundidad >= len(pasos):
             try:
-                puntuacion, justificacion = evaluar_pensamiento(problema, pasos, historia_actual)
+                puntuacion, justificacion = evaluar_nodo(contexto, problema, pasos, arbol, nodo_actual, final=True)
                 # Asegurarse de que puntuacion sea un número
                 if not isinstance(puntuacion, (int, float)):
                     print(f"⚠️ Puntuación no es numérica: {puntuacion}, usando 5 como valor predeterminado")
@@ -258,56 +1552,67 @@ def ejecutar_tot_bfs(problema, amplitud=3, max_profundidad=None, factor_ramifica
                     print(f"⚠️ Justificación no es una cadena: {type(justificacion)}, convirtiéndola")
                     justificacion = str(justificacion)
                 
-                mejores_soluciones.append((puntuacion, historia_actual, justificacion))
+                mejores_soluciones.append((puntuacion, arbol.camino(nodo_actual), justificacion))
                 print(f"\n👉 Solución completa evaluada con puntuación: {puntuacion}/10")
+                if criterio is not None:
+                    criterio.registrar_solucion(puntuacion)
             except Exception as e:
                 print(f"⚠️ Error al evaluar solución completa: {e}")
+            cola.expandido(nodo_actual)
             continue
         
         # Obtenemos el paso actual
         paso_actual = pasos[profundidad]
         
-        # Generamos varios pensamientos para este paso
-        for i in range(factor_ramificacion):
+        # Generamos varios pensamientos para este paso y fusionamos los casi duplicados
+        hijos = generar_hijos(contexto, problema, paso_actual, historial_actual, profundidad, factor_ramificacion, 0.7, 0.1,
+                              arbol[nodo_actual].clave,
+                              arbol.autoevaluaciones if contexto.modo_evaluacion == "fusionado" else None)
+        
+        # Utilizamos la evaluación del nodo padre como referencia si existe
+        evaluacion_previa = arbol[nodo_actual].evaluacion
+        nuevos = []
+        creados = []
+        
+        for i, (pensamiento, fusionados, intento) in enumerate(hijos):
             try:
-                print(f"\nGenerando pensamiento {i+1}/{factor_ramificacion} para PASO {profundidad+1}: {paso_actual['nombre']}...")
-                pensamiento = generar_pensamiento(problema, paso_actual, historia_actual, temperatura=0.7 + (i * 0.1))
-                
-                # Evaluar este pensamiento de forma individual
-                evaluacion_previa = None
-                if historia_actual:
-                    ultimo_paso = historia_actual[-1]
-                    # Utilizamos la evaluación anterior como referencia si existe
-                    if 'evaluacion' in ultimo_paso:
-                        evaluacion_previa = ultimo_paso['evaluacion']
+                # Nodo hijo con este pensamiento (solo guarda el puntero al padre)
+                nuevo_nodo = arbol.agregar(nodo_actual, paso_actual['nombre'], pensamiento, intento)
+                arbol[nuevo_nodo].fusionados = fusionados
+                creados.append(nuevo_nodo)
                 
-                # Paso con este pensamiento
-                nuevo_paso = {
-                    'nombre': paso_actual['nombre'],
-                    'pensamiento': pensamiento
-                }
-                
-                # Historia con este nuevo paso añadido
-                nueva_historia = historia_actual + [nuevo_paso]
+                # Sin presupuesto para evaluarlo, el nodo queda sin evaluar y no se expande
+                if presupuesto is not None and presupuesto.agotado():
+                    continue
                 
                 # Evaluar si vale la pena seguir por este camino
-                puntuacion, justificacion = evaluar_pensamiento(problema, pasos, nueva_historia, evaluacion_previa)
+                puntuacion, justificacion = evaluar_nodo(contexto, problema, pasos, arbol, nuevo_nodo, evaluacion_previa)
                 
                 # Asegurarse de que puntuacion sea un número
                 if not isinstance(puntuacion, (int, float)):
                     print(f"⚠️ Puntuación intermedia no es numérica: {puntuacion}, usando 5 como valor predeterminado")
                     puntuacion = 5
                 
-                nuevo_paso['evaluacion'] = puntuacion
-                nuevo_paso['justificacion'] = justificacion
+                arbol[nuevo_nodo].evaluacion = puntuacion
+                arbol[nuevo_nodo].justificacion = justificacion
                 
                 print(f"Evaluación del pensamiento: {puntuacion}/10")
                 print(f"Justificación: {justificacion[:100]}..." if len(justificacion) > 100 else f"Justificación: {justificacion}")
                 
-                # Añadir a la cola para exploración futura
-                cola.append((nueva_historia, profundidad + 1))
+                nuevos.append((puntuacion, nuevo_nodo))
             except Exception as e:
-                print(f"⚠️ Error durante la generación del pensamiento {i+1}: {e}")
+                print(f"⚠️ Error durante la evaluación del pensamiento {i+1}: {e}")
+        
+        # Añadir a la cola para exploración futura (solo el mejor si domina a sus hermanos)
+        if criterio is not None:
+            nuevos = criterio.filtrar_dominados(nuevos)
+        for _, nuevo_nodo in nuevos:
+            cola.append((nuevo_nodo, profundidad + 1))
+        
+        # El nodo expandido y los hijos descartados ya no están en la cola: sus textos pueden archivarse
+        encolados = {nuevo_nodo for _, nuevo_nodo in nuevos}
+        for nodo in [nodo_actual] + [n for n in creados if n not in encolados]:
+            cola.expandido(nodo)
     
     # Ordenar por puntuación
     try:
@@ -327,15 +1632,39 @@ def ejecutar_tot_bfs(problema, amplitud=3, max_profundidad=None, factor_ramifica
         
         mejores_soluciones = sorted(soluciones_validas, key=lambda x: x[0], reverse=True)
     
+    if not mejores_soluciones and presupuesto is not None and presupuesto.motivo:
+        cola.restaurar(arbol.mejores_nodos())
+        mejores_soluciones = soluciones_parciales(arbol, presupuesto.motivo)
+    informar_parada(criterio)
+    informar_presupuesto(presupuesto)
+    print(f"🧠 Memoria: {len(arbol)} nodos, ~{arbol.bytes_texto() / 1024:.1f} KB de texto en el árbol; {cola.resumen()}")
+    cola.cerrar()
+    
     return mejores_soluciones, pasos
 
-def ejecutar_tot_dfs(problema, max_profundidad=None, factor_ramificacion=3, beam_width=2):
-    """Ejecuta Tree of Thoughts utilizando DFS con beam search."""
+def ejecutar_tot_dfs(problema, max_profundidad=None, factor_ramificacion=3, beam_width=2, contexto=None):
+    """Ejecuta Tree of Thoughts utilizando DFS con beam search.
+    
+    La configuración llega en `contexto` (ContextoBusqueda). Con un
+    `presupuesto`, la búsqueda se detiene al alcanzar cualquiera de sus
+    límites y devuelve lo mejor encontrado hasta ese momento. `modo_evaluacion`
+    se usa en `evaluar_nodo` ("texto", "logprobs", "estructurado", "fusionado" o "incremental") y
+    `salida_estructurada` pide la descomposición en pasos como JSON.
+    Los pensamientos hermanos con similitud MinHash >= `umbral_duplicados` se
+    fusionan antes de evaluarlos (None para desactivarlo). Con un `registro`
+    (RegistroBusqueda) cada llamada completada se guarda en el checkpoint y las
+    ya guardadas no se repiten. Un `criterio` (CriterioParada) termina la
+    búsqueda al alcanzar una puntuación objetivo y poda los hermanos dominados.
+    """
     print(f"\n=== EJECUTANDO TREE OF THOUGHTS (DFS con Beam Search) ===")
     print(f"Problema: {problema}")
     
+    if contexto is None:
+        contexto = ContextoBusqueda()
+    presupuesto, criterio = contexto.presupuesto, contexto.criterio
+    
     # Dividir el problema en pasos
-    pasos = dividir_en_pasos(problema)
+    pasos = obtener_pasos(contexto, problema)
     print(f"\nProblema dividido en {len(pasos)} pasos:")
     for i, paso in enumerate(pasos):
         print(f"PASO {i+1}: {paso['nombre']} - {paso['descripcion']}")
@@ -346,70 +1675,398 @@ def ejecutar_tot_dfs(problema, max_profundidad=None, factor_ramificacion=3, beam
     # Soluciones completas encontradas
     soluciones_completas = []
     
-    def dfs(historia_actual, profundidad):
+    # Árbol compartido por toda la búsqueda
+    arbol = ArbolPensamientos()
+    
+    def dfs(nodo_actual, profundidad):
+        if presupuesto is not None and presupuesto.agotado():
+            return
+        if criterio is not None and criterio.detenido():
+            return
+        
+        historial_actual = arbol.historial_texto(nodo_actual)
+        
         # Si hemos llegado al final o a la profundidad máxima
         if profundidad >= max_profundidad or profundidad >= len(pasos):
-            puntuacion, justificacion = evaluar_pensamiento(problema, pasos, historia_actual)
-            soluciones_completas.append((puntuacion, historia_actual, justificacion))
+            puntuacion, justificacion = evaluar_nodo(contexto, problema, pasos, arbol, nodo_actual, final=True)
+            soluciones_completas.append((puntuacion, arbol.camino(nodo_actual), justificacion))
             print(f"\n👉 Solución completa evaluada con puntuación: {puntuacion}/10")
+            if criterio is not None:
+                criterio.registrar_solucion(puntuacion)
             return
         
         paso_actual = pasos[profundidad]
         candidatos = []
         
-        # Generar varios pensamientos para este paso
-        for i in range(factor_ramificacion):
-            print(f"\nGenerando pensamiento {i+1}/{factor_ramificacion} para PASO {profundidad+1}: {paso_actual['nombre']}...")
-            pensamiento = generar_pensamiento(problema, paso_actual, historia_actual, temperatura=0.6 + (i * 0.15))
-            
-            nuevo_paso = {
-                'nombre': paso_actual['nombre'],
-                'pensamiento': pensamiento
-            }
+        # Generar varios pensamientos para este paso y fusionar los casi duplicados
+        hijos = generar_hijos(contexto, problema, paso_actual, historial_actual, profundidad, factor_ramificacion, 0.6, 0.15,
+                              arbol[nodo_actual].clave,
+                              arbol.autoevaluaciones if contexto.modo_evaluacion == "fusionado" else None)
+        
+        for pensamiento, fusionados, intento in hijos:
+            nuevo_nodo = arbol.agregar(nodo_actual, paso_actual['nombre'], pensamiento, intento)
+            arbol[nuevo_nodo].fusionados = fusionados
             
-            nueva_historia = historia_actual + [nuevo_paso]
-            puntuacion, justificacion = evaluar_pensamiento(problema, pasos, nueva_historia)
+            # Sin presupuesto para evaluarlo, el nodo queda sin evaluar y no se expande
+            if presupuesto is not None and presupuesto.agotado():
+                continue
+            puntuacion, justificacion = evaluar_nodo(contexto, problema, pasos, arbol, nuevo_nodo)
             
-            nuevo_paso['evaluacion'] = puntuacion
-            nuevo_paso['justificacion'] = justificacion
+            arbol[nuevo_nodo].evaluacion = puntuacion
+            arbol[nuevo_nodo].justificacion = justificacion
             
             print(f"Evaluación del pensamiento: {puntuacion}/10")
             print(f"Justificación: {justificacion[:100]}..." if len(justificacion) > 100 else f"Justificación: {justificacion}")
             
-            candidatos.append((puntuacion, nueva_historia))
+            candidatos.append((puntuacion, nuevo_nodo))
         
         # Ordenar candidatos por puntuación y seleccionar los mejores (beam search)
-        candidatos.sort(key=lambda x: x[0], reverse=True)
+        candidatos = ordenar_candidatos(contexto, problema, pasos, arbol, candidatos, beam_width)
+        if criterio is not None:
+            candidatos = criterio.filtrar_dominados(candidatos)
         mejores_candidatos = candidatos[:beam_width]
         
         # Explorar en profundidad los mejores candidatos
-        for _, nueva_historia in mejores_candidatos:
-            dfs(nueva_historia, profundidad + 1)
+        for _, nuevo_nodo in mejores_candidatos:
+            dfs(nuevo_nodo, profundidad + 1)
     
     # Comenzar DFS
-    dfs([], 0)
+    dfs(ArbolPensamientos.RAIZ, 0)
     
     # Ordenar soluciones por puntuación
     soluciones_completas.sort(key=lambda x: x[0], reverse=True)
     
+    if not soluciones_completas and presupuesto is not None and presupuesto.motivo:
+        soluciones_completas = soluciones_parciales(arbol, presupuesto.motivo)
+    informar_parada(criterio)
+    informar_presupuesto(presupuesto)
+    
     return soluciones_completas, pasos
 
-def sintetizar_mejor_solucion(problema, solucion, pasos):
-    """Sintetiza la mejor solución en un formato claro y estructurado."""
-    # Construir el historial completo
-    historial = ""
-    for i, paso in enumerate(solucion):
-        historial += f"PASO {i+1}: {paso['nombre']}\n"
-        historial += f"Pensamiento: {paso['pensamiento']}\n"
-        if 'evaluacion' in paso:
-            historial += f"Evaluación: {paso['evaluacion']}/10\n"
-        historial += "\n"
+def puntuacion_uct(arbol, idx, c_exploracion):
+    """Valor UCT de un nodo hijo: media de sus valores más el término de exploración."""
+    nodo = arbol[idx]
+    if nodo.visitas == 0:
+        return float("inf")
+    visitas_padre = max(1, arbol[nodo.padre].visitas)
+    return nodo.valor_total / nodo.visitas + c_exploracion * math.sqrt(math.log(visitas_padre) / nodo.visitas)
+
+def mostrar_visitas_mcts(arbol, idx=ArbolPensamientos.RAIZ, nivel=0, max_nivel=3):
+    """Muestra el árbol explorado por MCTS con las visitas y el valor medio de cada nodo."""
+    for hijo in sorted(arbol[idx].hijos, key=lambda h: arbol[h].visitas, reverse=True):
+        nodo = arbol[hijo]
+        media = nodo.valor_total / nodo.visitas * 10 if nodo.visitas else 0
+        extra = f", fusionados: {nodo.fusionados}" if nodo.fusionados else ""
+        print(f"{'   ' * nivel}└─ PASO {nodo.profundidad}: {nodo.nombre} | visitas: {nodo.visitas}, "
+              f"valor medio: {media:.1f}/10{extra}")
+        if nivel + 1 < max_nivel:
+            mostrar_visitas_mcts(arbol, hijo, nivel + 1, max_nivel)
+
+def ejecutar_tot_mcts(problema, max_profundidad=None, factor_ramificacion=3, num_simulaciones=12, c_exploracion=1.4,
+                      contexto=None):
+    """Ejecuta Tree of Thoughts utilizando Monte Carlo Tree Search (UCT).
+    
+    Cada simulación selecciona un camino con UCT, expande un único pensamiento
+    nuevo con `generar_pensamiento`, usa la puntuación del evaluador como valor
+    y la retropropaga hasta la raíz. Así las llamadas se concentran en los
+    subárboles prometedores. Cuando el pensamiento completa el último paso,
+    su valor es la evaluación final de la solución (`final=True`), como en
+    las demás estrategias. Un nodo admite `factor_ramificacion` intentos de
+    expansión; los pensamientos casi duplicados de un hermano existente se
+    fusionan con él en lugar de evaluarse otra vez. La configuración llega en
+    `contexto` (ContextoBusqueda): con un `registro` las llamadas ya
+    completadas se reutilizan del checkpoint. Con un `criterio`
+    (CriterioParada) las simulaciones terminan cuando un camino completo alcanza
+    la puntuación objetivo; la poda por dominancia no se aplica porque UCT ya
+    reparte las visitas según el valor de cada rama.
+    """
+    print("\n=== EJECUTANDO TREE OF THOUGHTS (MCTS) ===")
+    print(f"Problema: {problema}")
+    
+    if contexto is None:
+        contexto = ContextoBusqueda()
+    presupuesto, criterio = contexto.presupuesto, contexto.criterio
+    
+    # Dividir el problema en pasos
+    pasos = obtener_pasos(contexto, problema)
+    print(f"\nProblema dividido en {len(pasos)} pasos:")
+    for i, paso in enumerate(pasos):
+        print(f"PASO {i+1}: {paso['nombre']} - {paso['descripcion']}")
+    
+    if max_profundidad is None:
+        max_profundidad = len(pasos)
+    max_profundidad = min(max_profundidad, len(pasos))
+    
+    arbol = ArbolPensamientos()
     
-    prompt = f"""Has resuelto el siguiente problema usando el método Tree of Thoughts:
-"{problema}"
+    for simulacion in range(num_simulaciones):
+        if presupuesto is not None and presupuesto.agotado():
+            break
+        print(f"\n--- Simulación {simulacion+1}/{num_simulaciones} ---")
+        
+        # 1. Selección: bajar por UCT mientras el nodo esté completamente expandido
+        nodo_actual = ArbolPensamientos.RAIZ
+        while (arbol[nodo_actual].profundidad < max_profundidad
+               and arbol[nodo_actual].expansiones >= factor_ramificacion and arbol[nodo_actual].hijos):
+            nodo_actual = max(arbol[nodo_actual].hijos, key=lambda h: puntuacion_uct(arbol, h, c_exploracion))
+        
+        profundidad = arbol[nodo_actual].profundidad
+        if profundidad >= max_profundidad:
+            # Nodo terminal ya evaluado: se reutiliza su valor
+            valor = (arbol[nodo_actual].evaluacion or 0) / 10
+        else:
+            # 2. Expansión: un pensamiento nuevo para el siguiente paso
+            paso_actual = pasos[profundidad]
+            expansion = arbol[nodo_actual].expansiones
+            arbol[nodo_actual].expansiones += 1
+            clave = f"{arbol[nodo_actual].clave}.{expansion}"
+            print(f"Expandiendo PASO {profundidad+1}: {paso_actual['nombre']} (intento {expansion+1}/{factor_ramificacion})...")
+            pensamiento = generar_pensamiento_registrado(contexto, problema, paso_actual, arbol.historial_texto(nodo_actual),
+                                                         0.7 + (expansion * 0.1), clave,
+                                                         arbol.autoevaluaciones if contexto.modo_evaluacion == "fusionado" else None)
+            if pensamiento is None or (presupuesto is not None and presupuesto.agotado()):
+                break
+            
+            duplicado = None
+            if contexto.umbral_duplicados is not None:
+                firma = firma_minhash(pensamiento)
+                for hermano in arbol[nodo_actual].hijos:
+                    if similitud_minhash(firma, firma_minhash(arbol[hermano].pensamiento)) >= contexto.umbral_duplicados:
+                        duplicado = hermano
+                        break
+            
+            if duplicado is not None:
+                print("🔁 Pensamiento casi duplicado de un hermano: se fusiona sin volver a evaluarlo")
+                arbol[duplicado].fusionados += 1
+                nodo_actual = duplicado
+                valor = (arbol[duplicado].evaluacion or 0) / 10
+            else:
+                # 3. Evaluación: la puntuación del evaluador es la estimación de valor
+                nuevo_nodo = arbol.agregar(nodo_actual, paso_actual['nombre'], pensamiento, expansion)
+                final = arbol[nuevo_nodo].profundidad >= max_profundidad
+                puntuacion, justificacion = evaluar_nodo(contexto, problema, pasos, arbol, nuevo_nodo,
+                                                         arbol[nodo_actual].evaluacion, final=final)
+                arbol[nuevo_nodo].evaluacion = puntuacion
+                arbol[nuevo_nodo].justificacion = justificacion
+                if final:
+                    print(f"\n👉 Solución completa evaluada con puntuación: {puntuacion}/10")
+                else:
+                    print(f"Evaluación del pensamiento: {puntuacion}/10")
+                nodo_actual = nuevo_nodo
+                valor = puntuacion / 10
+        
+        # 4. Retropropagación
+        idx = nodo_actual
+        while idx != -1:
+            arbol[idx].visitas += 1
+            arbol[idx].valor_total += valor
+            idx = arbol[idx].padre
+        
+        if (criterio is not None and arbol[nodo_actual].profundidad >= max_profundidad
+                and criterio.registrar_solucion(arbol[nodo_actual].evaluacion or 0)):
+            break
+    
+    print("\n📊 Visitas por nodo (MCTS):")
+    mostrar_visitas_mcts(arbol)
+    
+    # Las soluciones son los caminos que llegaron al último paso
+    terminales = [i for i in range(1, len(arbol)) if arbol[i].profundidad >= max_profundidad and arbol[i].evaluacion is not None]
+    terminales.sort(key=lambda i: (arbol[i].evaluacion, arbol[i].visitas), reverse=True)
+    soluciones = [(arbol[i].evaluacion, arbol.camino(i), arbol[i].justificacion) for i in terminales]
+    
+    if not soluciones:
+        motivo = presupuesto.motivo if presupuesto is not None and presupuesto.motivo else "límite de simulaciones"
+        soluciones = soluciones_parciales(arbol, motivo)
+    informar_parada(criterio)
+    informar_presupuesto(presupuesto)
+    
+    return soluciones, pasos
 
-Aquí está el proceso de solución paso a paso que has generado:
-{historial}
+def ejecutar_tot_pipeline(problema, max_profundidad=None, factor_ramificacion=3, beam_width=2, hilos_generacion=2,
+                          hilos_evaluacion=2, contexto=None):
+    """Ejecuta Tree of Thoughts con beam search como un pipeline productor/consumidor.
+    
+    La búsqueda se divide en etapas conectadas por colas:
+    descomposición en pasos → generación de pensamientos → evaluación →
+    selección de la frontera. La generación y la evaluación tienen su propio
+    grupo de hilos (`hilos_generacion`, `hilos_evaluacion`), de modo que
+    mientras se evalúan los hijos de un nodo ya se están generando los de otro
+    y el servidor del modelo nunca queda ocioso esperando a la etapa anterior.
+    La selección de la frontera corre en el hilo principal: cuando llegan todas
+    las evaluaciones de los hijos de un nodo, elige los `beam_width` mejores y
+    encola su expansión. A diferencia de `ejecutar_tot_dfs`, no recorre el
+    árbol en profundidad: los nodos seleccionados se expanden a la vez, así que
+    el beam avanza nivel a nivel en paralelo. Todos los hilos comparten
+    el mismo `contexto` (ContextoBusqueda). Si su `criterio` (CriterioParada)
+    se cumple, las tareas aún en cola se descartan sin llamar al modelo.
+    Ambos grupos necesitan al menos un hilo; si no, lanza ValueError.
+    """
+    if hilos_generacion < 1 or hilos_evaluacion < 1:
+        raise ValueError("el pipeline necesita al menos un hilo de generación y uno de evaluación")
+    
+    print("\n=== EJECUTANDO TREE OF THOUGHTS (Pipeline Beam Search) ===")
+    print(f"Problema: {problema}")
+    print(f"Hilos de generación: {hilos_generacion}, hilos de evaluación: {hilos_evaluacion}")
+    
+    if contexto is None:
+        contexto = ContextoBusqueda()
+    presupuesto, criterio = contexto.presupuesto, contexto.criterio
+    
+    # Etapa 1: descomposición en pasos (una sola llamada, previa al resto)
+    pasos = obtener_pasos(contexto, problema)
+    print(f"\nProblema dividido en {len(pasos)} pasos:")
+    for i, paso in enumerate(pasos):
+        print(f"PASO {i+1}: {paso['nombre']} - {paso['descripcion']}")
+    
+    if max_profundidad is None:
+        max_profundidad = len(pasos)
+    max_profundidad = min(max_profundidad, len(pasos))
+    
+    arbol = ArbolPensamientos()
+    soluciones_completas = []
+    autoevaluaciones = arbol.autoevaluaciones if contexto.modo_evaluacion == "fusionado" else None
+    
+    cola_generacion = queue.Queue()   # (nodo_padre, intento)
+    cola_evaluacion = queue.Queue()   # (nodo, final)
+    cola_resultados = queue.Queue()   # resultados de ambas etapas hacia la selección
+    
+    # Etapa 2: generación de pensamientos
+    def trabajador_generacion():
+        while True:
+            tarea = cola_generacion.get()
+            if tarea is None:
+                return
+            padre, intento = tarea
+            profundidad = arbol[padre].profundidad
+            pensamiento = None
+            if criterio is not None and criterio.detenido():
+                cola_resultados.put(("pensamiento", padre, intento, pensamiento))
+                continue
+            try:
+                pensamiento = generar_pensamiento_registrado(contexto, problema, pasos[profundidad], arbol.historial_texto(padre),
+                                                             0.6 + intento * 0.15, f"{arbol[padre].clave}.{intento}",
+                                                             autoevaluaciones)
+                if pensamiento is not None:
+                    print(f"🧵 Pensamiento {intento+1}/{factor_ramificacion} generado para PASO {profundidad+1}: {pasos[profundidad]['nombre']}")
+            except Exception as e:
+                print(f"⚠️ Error durante la generación del pensamiento {intento+1}: {e}")
+            cola_resultados.put(("pensamiento", padre, intento, pensamiento))
+    
+    # Etapa 3: evaluación
+    def trabajador_evaluacion():
+        while True:
+            tarea = cola_evaluacion.get()
+            if tarea is None:
+                return
+            nodo, final = tarea
+            resultado = None
+            if not contexto.agotado() and not contexto.detenido():
+                try:
+                    resultado = evaluar_nodo(contexto, problema, pasos, arbol, nodo, final=final)
+                except Exception as e:
+                    print(f"⚠️ Error durante la evaluación: {e}")
+            cola_resultados.put(("evaluacion", nodo, final, resultado))
+    
+    hilos = ([threading.Thread(target=trabajador_generacion, daemon=True) for _ in range(hilos_generacion)]
+             + [threading.Thread(target=trabajador_evaluacion, daemon=True) for _ in range(hilos_evaluacion)])
+    for hilo in hilos:
+        hilo.start()
+    
+    # Etapa 4: selección de la frontera (hilo principal, único que modifica el estado de la búsqueda)
+    pendientes = 0
+    generados = {}             # nodo_padre -> pensamiento recibido por intento (None si falló)
+    faltan_generaciones = {}
+    candidatos = defaultdict(list)  # nodo_padre -> [(puntuacion, hijo)]
+    faltan_evaluaciones = {}
+    
+    def encolar_expansion(nodo):
+        nonlocal pendientes
+        if arbol[nodo].profundidad >= max_profundidad:
+            cola_evaluacion.put((nodo, True))
+            pendientes += 1
+            return
+        generados[nodo] = [None] * factor_ramificacion
+        faltan_generaciones[nodo] = factor_ramificacion
+        for intento in range(factor_ramificacion):
+            cola_generacion.put((nodo, intento))
+        pendientes += factor_ramificacion
+    
+    encolar_expansion(ArbolPensamientos.RAIZ)
+    
+    while pendientes:
+        tipo, nodo, dato, resultado = cola_resultados.get()
+        pendientes -= 1
+        
+        if tipo == "pensamiento":
+            generados[nodo][dato] = resultado
+            faltan_generaciones[nodo] -= 1
+            if faltan_generaciones[nodo] or (criterio is not None and criterio.detenido()):
+                continue
+            # Han llegado todos los hermanos: se fusionan los casi duplicados y pasan a evaluación
+            hijos = fusionar_hermanos(generados.pop(nodo), contexto.umbral_duplicados)
+            paso_actual = pasos[arbol[nodo].profundidad]
+            faltan_evaluaciones[nodo] = len(hijos)
+            for pensamiento, fusionados, intento in hijos:
+                nuevo_nodo = arbol.agregar(nodo, paso_actual['nombre'], pensamiento, intento)
+                arbol[nuevo_nodo].fusionados = fusionados
+                cola_evaluacion.put((nuevo_nodo, False))
+                pendientes += 1
+        
+        elif dato:  # evaluación de una solución completa
+            if resultado is not None:
+                puntuacion, justificacion = resultado
+                soluciones_completas.append((puntuacion, arbol.camino(nodo), justificacion))
+                print(f"\n👉 Solución completa evaluada con puntuación: {puntuacion}/10")
+                if criterio is not None:
+                    criterio.registrar_solucion(puntuacion)
+        
+        else:
+            padre = arbol[nodo].padre
+            if resultado is not None:
+                puntuacion, justificacion = resultado
+                arbol[nodo].evaluacion = puntuacion
+                arbol[nodo].justificacion = justificacion
+                print(f"Evaluación del pensamiento (PASO {arbol[nodo].profundidad}): {puntuacion}/10")
+                candidatos[padre].append((puntuacion, nodo))
+            faltan_evaluaciones[padre] -= 1
+            if faltan_evaluaciones[padre]:
+                continue
+            # Todos los hijos evaluados: beam search sobre ellos
+            if criterio is not None and criterio.detenido():
+                continue
+            mejores_candidatos = ordenar_candidatos(contexto, problema, pasos, arbol, candidatos.pop(padre, []), beam_width)
+            if criterio is not None:
+                mejores_candidatos = criterio.filtrar_dominados(mejores_candidatos)
+            mejores_candidatos = mejores_candidatos[:beam_width]
+            if presupuesto is not None and presupuesto.agotado():
+                continue
+            for _, hijo in mejores_candidatos:
+                encolar_expansion(hijo)
+    
+    for _ in range(hilos_generacion):
+        cola_generacion.put(None)
+    for _ in range(hilos_evaluacion):
+        cola_evaluacion.put(None)
+    for hilo in hilos:
+        hilo.join()
+    
+    soluciones_completas.sort(key=lambda x: x[0], reverse=True)
+    
+    if not soluciones_completas and presupuesto is not None and presupuesto.motivo:
+        soluciones_completas = soluciones_parciales(arbol, presupuesto.motivo)
+    informar_parada(criterio)
+    informar_presupuesto(presupuesto)
+    
+    return soluciones_completas, pasos
+
+def sintetizar_mejor_solucion(contexto, problema, solucion, pasos):
+    """Sintetiza la mejor solución en un formato claro y estructurado (fuera del presupuesto de la búsqueda)."""
+    # El historial va con el mismo formato que en la búsqueda para compartir prefijo con su evaluación
+    evaluaciones = ", ".join(f"PASO {i+1}: {paso['evaluacion']}/10" for i, paso in enumerate(solucion) if 'evaluacion' in paso)
+    linea_evaluaciones = f"Evaluación de cada paso: {evaluaciones}." if evaluaciones else ""
+    
+    prompt = construir_prompt(problema, f"""Has resuelto el problema usando el método Tree of Thoughts con los pasos anteriores.
+{linea_evaluaciones}
 
 Por favor, sintetiza esta solución en un formato claro y conciso:
 1. Resume el enfoque general utilizado
@@ -417,9 +2074,9 @@ Por favor, sintetiza esta solución en un formato claro y conciso:
 3. Destaca cualquier insight o concepto clave que se haya aplicado
 
 Tu síntesis debe ser accesible para alguien que no haya visto todo el proceso de pensamiento.
-"""
+""", formatear_historial(solucion))
 
-    respuesta, error = llamar_lmstudio_api(prompt, modelo_seleccionado, temperatura=0.3, timeout=90)
+    respuesta, error = contexto.llamar(prompt, temperatura=0.3, timeout=90, con_presupuesto=False)
     
     if error:
         print(f"Error al sintetizar solución: {error}")
@@ -427,7 +2084,7 @@ Tu síntesis debe ser accesible para alguien que no haya visto todo el proceso d
     
     return respuesta.strip()
 
-def guardar_resultados(problema, mejores_soluciones, pasos, sintesis, estrategia):
+def guardar_resultados(problema, mejores_soluciones, pasos, sintesis, estrategia, presupuesto=None):
     """Guarda los resultados en un archivo para análisis posterior."""
     # Crear carpeta de resultados si no existe
     os.makedirs("resultados_tot", exist_ok=True)
@@ -460,6 +2117,10 @@ def guardar_resultados(problema, mejores_soluciones, pasos, sintesis, estrategia
         
         f.write("\n\nSÍNTESIS DE LA MEJOR SOLUCIÓN:\n")
         f.write(sintesis)
+        
+        if presupuesto is not None:
+            f.write("\n\nUSO DEL PRESUPUESTO:\n")
+            f.write(presupuesto.resumen() + "\n")
     
     print(f"\nResultados guardados en {filename}")
     return filename
@@ -476,6 +2137,8 @@ def mostrar_solucion(solucion, puntuacion=None, justificacion=None):
         if 'evaluacion' in paso:
             print(f"\nEvaluación: {paso['evaluacion']}/10")
             print(f"Justificación: {paso['justificacion']}")
+        if 'visitas' in paso:
+            print(f"Visitas (MCTS): {paso['visitas']}")
     
     if justificacion:
         print("\nJustificación final:")
@@ -483,33 +2146,115 @@ def mostrar_solucion(solucion, puntuacion=None, justificacion=None):
     
     print("=" * 60)
 
+# Problemas predefinidos del menú: (título, enunciado)
+PROBLEMAS_MENU = [
+    ("Problema del apretón de manos",
+     "Hay 5 personas en una habitación. Cada persona saluda a todas las demás con un apretón de manos. ¿Cuántos apretones de manos hay en total?"),
+    ("Problema de los caballos del ajedrez",
+     "¿Cuál es el número mínimo de caballos de ajedrez necesarios para atacar todas las casillas de un tablero de ajedrez estándar de 8x8?"),
+    ("Problema de probabilidad",
+     "Si lanzo dos dados de seis caras, ¿cuál es la probabilidad de que la suma sea un número primo?"),
+    ("Problema de lógica",
+     "Ana, Beatriz y Carlos están en una isla de caníbales y mentirosos. Los caníbales siempre mienten y los mentirosos siempre dicen la verdad. Ana dice: 'Todos somos caníbales'. Beatriz dice: 'Exactamente uno de nosotros es mentiroso'. ¿Qué es Carlos?"),
+]
+
+# Problemas con respuesta conocida para comparar estrategias y modos de evaluación.
+# `respuesta` es una expresión regular que debe aparecer en el último paso de la mejor solución.
+PROBLEMAS_BENCHMARK = [
+    {"nombre": "apretones", "problema": PROBLEMAS_MENU[0][1], "respuesta": r"\b10\b"},
+    {"nombre": "caballos", "problema": PROBLEMAS_MENU[1][1], "respuesta": r"\b12\b"},
+    {"nombre": "dados", "problema": PROBLEMAS_MENU[2][1], "respuesta": r"15\s*/\s*36|5\s*/\s*12|0[.,]41[67]|41[.,]6"},
+    {"nombre": "isla", "problema": PROBLEMAS_MENU[3][1], "respuesta": r"Carlos\s+es\s+(un\s+)?can[ií]bal"},
+]
+
+def precalcular_pasos(contexto, problemas):
+    """Calcula y guarda en `contexto.cache_pasos` la descomposición de los problemas que aún no la tienen.
+    
+    Pensado para preparar un lote de problemas antes de ejecutar búsquedas o
+    benchmarks, de modo que ninguna empiece esperando por la descomposición.
+    """
+    cache_pasos = contexto.cache_pasos
+    nuevos = 0
+    for problema in problemas:
+        if cache_pasos.obtener(problema, contexto.modelo) is not None:
+            print(f"✔️ Ya en caché: {problema[:70]}")
+            continue
+        print(f"Dividiendo en pasos: {problema[:70]}")
+        pasos = dividir_en_pasos(contexto, problema)
+        if pasos == PASOS_POR_DEFECTO:
+            print("⚠️ El modelo no devolvió una descomposición válida; no se guarda")
+            continue
+        cache_pasos.guardar(problema, contexto.modelo, pasos)
+        nuevos += 1
+    print(f"\n{nuevos} descomposición(es) nueva(s) guardada(s) en {cache_pasos.ruta}")
+
+def ejecutar_benchmark(contexto, estrategia="dfs", modos=("texto", "fusionado"), **parametros):
+    """Resuelve PROBLEMAS_BENCHMARK con cada modo de evaluación y compara los resultados.
+    
+    Cada búsqueda usa una copia de `contexto` con su propio presupuesto. Para cada modo se cuentan los aciertos (la respuesta conocida aparece en
+    el último paso de la mejor solución), las llamadas al modelo y los tokens
+    generados, de modo que se pueda medir cuánta precisión se pierde a cambio
+    de las llamadas que ahorra un modo como el fusionado.
+    """
+    buscadores = {"bfs": ejecutar_tot_bfs, "dfs": ejecutar_tot_dfs, "mcts": ejecutar_tot_mcts,
+                  "pipeline": ejecutar_tot_pipeline}
+    resultados = {}
+    
+    for modo in modos:
+        filas = []
+        for caso in PROBLEMAS_BENCHMARK:
+            print(f"\n##### BENCHMARK: {caso['nombre']} (estrategia {estrategia}, modo {modo}) #####")
+            presupuesto = PresupuestoBusqueda()
+            contexto_caso = contexto.derivar(presupuesto=presupuesto, modo_evaluacion=modo,
+                                             salida_estructurada=modo == "estructurado")
+            soluciones, _ = buscadores[estrategia](caso["problema"], contexto=contexto_caso, **parametros)
+            ultimo_paso = soluciones[0][1][-1]["pensamiento"] if soluciones and soluciones[0][1] else ""
+            filas.append({
+                "problema": caso["nombre"],
+                "acierto": re.search(caso["respuesta"], ultimo_paso, re.IGNORECASE) is not None,
+                "llamadas": presupuesto.llamadas,
+                "tokens_generados": presupuesto.tokens_generados,
+                "segundos": round(presupuesto.segundos_transcurridos(), 1),
+            })
+        resultados[modo] = filas
+    
+    print("\n" + "=" * 60)
+    print(f"RESULTADOS DEL BENCHMARK ({estrategia.upper()})")
+    print("=" * 60)
+    print(f"{'Modo':<14}{'Aciertos':>10}{'Llamadas':>10}{'Tokens':>10}{'Tiempo':>10}")
+    for modo, filas in resultados.items():
+        aciertos = sum(fila["acierto"] for fila in filas)
+        print(f"{modo:<14}{f'{aciertos}/{len(filas)}':>10}{sum(f['llamadas'] for f in filas):>10}"
+              f"{sum(f['tokens_generados'] for f in filas):>10}{sum(f['segundos'] for f in filas):>9.1f}s")
+    
+    os.makedirs("resultados_tot", exist_ok=True)
+    filename = f"resultados_tot/benchmark_{estrategia}_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados guardados en: {filename}")
+    
+    return resultados
+
 def mostrar_menu_problema():
     """Muestra un menú para seleccionar el problema a resolver."""
     print("\n==== MENÚ DE PROBLEMAS ====")
-    print("1. Problema del apretón de manos")
-    print("2. Problema de los caballos del ajedrez")
-    print("3. Problema de probabilidad")
-    print("4. Problema de lógica")
-    print("5. Ingresar problema personalizado")
+    for i, (titulo, _) in enumerate(PROBLEMAS_MENU):
+        print(f"{i+1}. {titulo}")
+    opcion_personalizada = len(PROBLEMAS_MENU) + 1
+    print(f"{opcion_personalizada}. Ingresar problema personalizado")
     
     while True:
         try:
-            opcion = int(input("\nSeleccione un problema (1-5): "))
-            if 1 <= opcion <= 5:
+            opcion = int(input(f"\nSeleccione un problema (1-{opcion_personalizada}): "))
+            if 1 <= opcion <= opcion_personalizada:
                 break
             else:
-                print("Por favor, seleccione una opción válida (1-5).")
+                print(f"Por favor, seleccione una opción válida (1-{opcion_personalizada}).")
         except ValueError:
             print("Por favor, ingrese un número válido.")
     
-    if opcion == 1:
-        return "Hay 5 personas en una habitación. Cada persona saluda a todas las demás con un apretón de manos. ¿Cuántos apretones de manos hay en total?"
-    elif opcion == 2:
-        return "¿Cuál es el número mínimo de caballos de ajedrez necesarios para atacar todas las casillas de un tablero de ajedrez estándar de 8x8?"
-    elif opcion == 3:
-        return "Si lanzo dos dados de seis caras, ¿cuál es la probabilidad de que la suma sea un número primo?"
-    elif opcion == 4:
-        return "Ana, Beatriz y Carlos están en una isla de caníbales y mentirosos. Los caníbales siempre mienten y los mentirosos siempre dicen la verdad. Ana dice: 'Todos somos caníbales'. Beatriz dice: 'Exactamente uno de nosotros es mentiroso'. ¿Qué es Carlos?"
+    if opcion < opcion_personalizada:
+        return PROBLEMAS_MENU[opcion - 1][1]
     else:
         return input("\nIngrese su problema personalizado: ")
 
@@ -518,17 +2263,129 @@ def mostrar_menu_estrategia():
     print("\n==== ESTRATEGIA DE BÚSQUEDA ====")
     print("1. Breadth-First Search (BFS)")
     print("2. Depth-First Search con Beam Search (DFS+Beam)")
+    print("3. Monte Carlo Tree Search (MCTS)")
+    print("4. Pipeline Beam Search (generación y evaluación concurrentes, nivel a nivel)")
     
     while True:
         try:
-            opcion = int(input("\nSeleccione una estrategia (1-2): "))
-            if 1 <= opcion <= 2:
-                return "bfs" if opcion == 1 else "dfs"
+            opcion = int(input("\nSeleccione una estrategia (1-4): "))
+            if 1 <= opcion <= 4:
+                return ["bfs", "dfs", "mcts", "pipeline"][opcion - 1]
             else:
-                print("Por favor, seleccione una opción válida (1-2).")
+                print("Por favor, seleccione una opción válida (1-4).")
         except ValueError:
             print("Por favor, ingrese un número válido.")
 
+def mostrar_menu_evaluacion():
+    """Muestra un menú para seleccionar el modo de evaluación de pensamientos."""
+    print("\n==== MODO DE EVALUACIÓN ====")
+    print("1. Texto (puntuación entera + justificación)")
+    print("2. Logprobs (un solo token, puntuación continua; justificación solo en soluciones completas)")
+    print("3. Estructurado (JSON con esquema para la evaluación y la división en pasos)")
+    print("4. Fusionado (pensamiento + autoevaluación en una llamada; evaluador solo para desempates y soluciones completas)")
+    print("5. Incremental (evalúa solo el paso nuevo sobre un resumen acumulado del camino)")
+    
+    while True:
+        try:
+            opcion = int(input("\nSeleccione un modo (1-5, Enter = 1): ") or "1")
+            if 1 <= opcion <= 5:
+                return ["texto", "logprobs", "estructurado", "fusionado", "incremental"][opcion - 1]
+            else:
+                print("Por favor, seleccione una opción válida (1-5).")
+        except ValueError:
+            print("Por favor, ingrese un número válido.")
+
+def mostrar_menu_presupuesto():
+    """Pide los límites de la búsqueda (Enter = valor recomendado, 0 = sin límite)."""
+    print("\n==== PRESUPUESTO DE LA BÚSQUEDA ====")
+    print("Pulsa Enter para usar el valor recomendado o escribe 0 para no poner límite.")
+    
+    def pedir_limite(mensaje, recomendado):
+        while True:
+            valor = input(f"{mensaje} (recomendado: {recomendado}): ").strip()
+            if not valor:
+                return recomendado
+            try:
+                numero = int(valor)
+                return numero if numero > 0 else None
+            except ValueError:
+                print("Por favor, ingrese un número válido.")
+    
+    max_llamadas = pedir_limite("Máximo de llamadas al modelo", 60)
+    max_tokens = pedir_limite("Máximo de tokens generados", 40000)
+    limite_segundos = pedir_limite("Tiempo máximo en segundos", 900)
+    return PresupuestoBusqueda(max_llamadas, max_tokens, limite_segundos)
+
+def mostrar_menu_parada():
+    """Pide las reglas de parada anticipada (Enter = valor recomendado, 0 = desactivada)."""
+    print("\n==== PARADA ANTICIPADA ====")
+    print("Pulsa Enter para usar el valor recomendado o escribe 0 para desactivar la regla.")
+    
+    def pedir_valor(mensaje, recomendado):
+        while True:
+            valor = input(f"{mensaje} (recomendado: {recomendado}): ").strip()
+            if not valor:
+                return recomendado
+            try:
+                numero = float(valor)
+                return numero if numero > 0 else None
+            except ValueError:
+                print("Por favor, ingrese un número válido.")
+    
+    puntuacion_objetivo = pedir_valor("Puntuación objetivo de una solución completa (1-10)", 9)
+    margen_dominancia = pedir_valor("Margen con el que el mejor hermano cancela a los demás", 3)
+    return CriterioParada(puntuacion_objetivo, margen_dominancia)
+
+def mostrar_menu_parametros(estrategia):
+    """Pide los parámetros de la estrategia; devuelve {} (valores por defecto) si la entrada no es válida."""
+    try:
+        if estrategia == "bfs":
+            print("\nConfigurando parámetros para BFS...")
+            amplitud = int(input("Número de soluciones a generar (recomendado: 3): ") or "3")
+            factor_ramificacion = int(input("Factor de ramificación (pensamientos por paso, recomendado: 2): ") or "2")
+            limite_memoria_kb = int(input("Memoria máxima de textos en KB (frontera y nodos expandidos) antes de volcar a disco (0 = sin límite, recomendado: 1024): ") or "1024")
+            return {"amplitud": amplitud, "factor_ramificacion": factor_ramificacion,
+                    "limite_memoria_kb": limite_memoria_kb or None}
+        if estrategia == "mcts":
+            print("\nConfigurando parámetros para MCTS...")
+            num_simulaciones = int(input("Número de simulaciones (recomendado: 12): ") or "12")
+            factor_ramificacion = int(input("Factor de ramificación (pensamientos por paso, recomendado: 3): ") or "3")
+            return {"factor_ramificacion": factor_ramificacion, "num_simulaciones": num_simulaciones}
+        if estrategia == "pipeline":
+            print("\nConfigurando parámetros para el pipeline Beam Search...")
+            factor_ramificacion = int(input("Factor de ramificación (pensamientos por paso, recomendado: 3): ") or "3")
+            beam_width = int(input("Ancho del beam (caminos a explorar, recomendado: 2): ") or "2")
+            hilos_generacion = int(input("Hilos de generación (recomendado: 2): ") or "2")
+            hilos_evaluacion = int(input("Hilos de evaluación (recomendado: 2): ") or "2")
+            if hilos_generacion < 1 or hilos_evaluacion < 1:
+                raise ValueError("se necesita al menos un hilo de cada tipo")
+            return {"factor_ramificacion": factor_ramificacion, "beam_width": beam_width,
+                    "hilos_generacion": hilos_generacion, "hilos_evaluacion": hilos_evaluacion}
+        print("\nConfigurando parámetros para DFS con Beam Search...")
+        factor_ramificacion = int(input("Factor de ramificación (pensamientos por paso, recomendado: 3): ") or "3")
+        beam_width = int(input("Ancho del beam (caminos a explorar, recomendado: 2): ") or "2")
+        return {"factor_ramificacion": factor_ramificacion, "beam_width": beam_width}
+    except ValueError:
+        print("Se usarán valores por defecto debido a entrada inválida.")
+        return {}
+
+def mostrar_menu_checkpoint(problema, estrategia, configuracion):
+    """Pregunta si reanudar un checkpoint existente o guardar uno nuevo; devuelve None si no se usa."""
+    huella = hashlib.sha1(problema.encode("utf-8")).hexdigest()[:10]
+    ruta = f"resultados_tot/checkpoint_{estrategia}_{huella}.jsonl"
+    
+    reanudar = False
+    if os.path.exists(ruta):
+        respuesta = input(f"\nSe encontró un checkpoint de una búsqueda anterior ({ruta}). ¿Reanudarla? (S/n): ").strip().lower()
+        reanudar = respuesta in ("", "s", "si", "sí")
+    if not reanudar:
+        respuesta = input("\n¿Guardar un checkpoint incremental para poder reanudar la búsqueda si se interrumpe? (s/N): ").strip().lower()
+        if respuesta not in ("s", "si", "sí"):
+            return None
+    
+    print(f"Guardando checkpoint incremental en {ruta}")
+    return RegistroBusqueda(ruta, problema, estrategia, reanudar, configuracion)
+
 if __name__ == '__main__':
     print("=" * 60)
     print("DEMOSTRACIÓN DE TREE OF THOUGHTS (ToT) CON LM STUDIO")
@@ -536,7 +2393,7 @@ if __name__ == '__main__':
     print("\nVerificando que el servidor de LM Studio esté en ejecución...")
     
     try:
-        response = requests.get("http://localhost:1234/v1/models", timeout=5)
+        response = requests.get(f"{URL_LMSTUDIO}/v1/models", timeout=5)
         if response.status_code == 200:
             print(f"LM Studio está en ejecución")
         else:
@@ -563,31 +2420,57 @@ if __name__ == '__main__':
     modelo_seleccionado = modelos[0]  # Usar el primer modelo disponible
     print(f"\nUsando modelo: {modelo_seleccionado}")
     
+    # Modo benchmark: python treeofthoughts-lmstudio.py --benchmark [bfs|dfs|mcts|pipeline]
+    if "--benchmark" in sys.argv:
+        posicion = sys.argv.index("--benchmark") + 1
+        estrategia = sys.argv[posicion] if posicion < len(sys.argv) else "dfs"
+        ejecutar_benchmark(ContextoBusqueda(modelo_seleccionado, cache_pasos=CacheDescomposiciones()), estrategia)
+        sys.exit(0)
+    
+    # Precalcular descomposiciones: --precalcular-pasos [archivo con un problema por línea]
+    if "--precalcular-pasos" in sys.argv:
+        posicion = sys.argv.index("--precalcular-pasos") + 1
+        if posicion < len(sys.argv):
+            with open(sys.argv[posicion], "r", encoding="utf-8") as f:
+                problemas = [linea.strip() for linea in f if linea.strip()]
+        else:
+            problemas = [enunciado for _, enunciado in PROBLEMAS_MENU]
+        precalcular_pasos(ContextoBusqueda(modelo_seleccionado, cache_pasos=CacheDescomposiciones()), problemas)
+        sys.exit(0)
+    
     # Seleccionar problema
     problema = mostrar_menu_problema()
     
     # Seleccionar estrategia
     estrategia = mostrar_menu_estrategia()
     
-    # Configurar parámetros según la estrategia
-    if estrategia == "bfs":
-        print("\nConfigurando parámetros para BFS...")
-        try:
-            amplitud = int(input("Número de soluciones a generar (recomendado: 3): ") or "3")
-            factor_ramificacion = int(input("Factor de ramificación (pensamientos por paso, recomendado: 2): ") or "2")
-            mejores_soluciones, pasos = ejecutar_tot_bfs(problema, amplitud, factor_ramificacion=factor_ramificacion)
-        except ValueError:
-            print("Se usarán valores por defecto debido a entrada inválida.")
-            mejores_soluciones, pasos = ejecutar_tot_bfs(problema)
-    else:  # dfs
-        print("\nConfigurando parámetros para DFS con Beam Search...")
-        try:
-            factor_ramificacion = int(input("Factor de ramificación (pensamientos por paso, recomendado: 3): ") or "3")
-            beam_width = int(input("Ancho del beam (caminos a explorar, recomendado: 2): ") or "2")
-            mejores_soluciones, pasos = ejecutar_tot_dfs(problema, factor_ramificacion=factor_ramificacion, beam_width=beam_width)
-        except ValueError:
-            print("Se usarán valores por defecto debido a entrada inválida.")
-            mejores_soluciones, pasos = ejecutar_tot_dfs(problema)
+    # Seleccionar modo de evaluación
+    modo_evaluacion = mostrar_menu_evaluacion()
+    
+    # Límites de llamadas, tokens y tiempo
+    presupuesto = mostrar_menu_presupuesto()
+    
+    # Parada anticipada por puntuación objetivo o dominancia
+    criterio = mostrar_menu_parada()
+    
+    # Parámetros de la estrategia
+    parametros = mostrar_menu_parametros(estrategia)
+    
+    # Contexto de la búsqueda: modelo, servidor, presupuesto, checkpoint y cachés
+    contexto = ContextoBusqueda(modelo_seleccionado, presupuesto=presupuesto, criterio=criterio,
+                                cache_pasos=CacheDescomposiciones(), modo_evaluacion=modo_evaluacion,
+                                salida_estructurada=modo_evaluacion == "estructurado")
+    
+    # Checkpoint incremental opcional (permite reanudar si el servidor falla)
+    registro = mostrar_menu_checkpoint(problema, estrategia, dict(contexto.configuracion(), **parametros))
+    contexto = contexto.derivar(registro=registro)
+    
+    ejecutar_estrategia = {"bfs": ejecutar_tot_bfs, "dfs": ejecutar_tot_dfs, "mcts": ejecutar_tot_mcts,
+                           "pipeline": ejecutar_tot_pipeline}[estrategia]
+    mejores_soluciones, pasos = ejecutar_estrategia(problema, contexto=contexto, **parametros)
+    
+    if registro is not None:
+        registro.cerrar()
     
     # Mostrar la mejor solución
     if mejores_soluciones:
@@ -597,7 +2480,7 @@ if __name__ == '__main__':
         
         # Sintetizar la mejor solución
         print("\nSintetizando la mejor solución...")
-        sintesis = sintetizar_mejor_solucion(problema, mejor_solucion, pasos)
+        sintesis = sintetizar_mejor_solucion(contexto, problema, mejor_solucion, pasos)
         
         print("\n" + "=" * 60)
         print("SÍNTESIS DE LA SOLUCIÓN")
@@ -606,7 +2489,7 @@ if __name__ == '__main__':
         print("=" * 60)
         
         # Guardar resultados
-        archivo = guardar_resultados(problema, mejores_soluciones, pasos, sintesis, estrategia)
+        archivo = guardar_resultados(problema, mejores_soluciones, pasos, sintesis, estrategia, presupuesto)
         print(f"\nSe ha guardado un registro detallado en: {archivo}")
     else:
         print("\n⚠️ No se encontraron soluciones válidas.")
\ No newline at end of file